@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# --- 생성된 결과물(엑셀 등) 캐시: 메모리 LRU + 디스크 LRU ---
+# 키는 입력 내용의 해시이므로 같은 입력이면 같은 결과물을 돌려준다.
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "artifacts")
+
+
+def _hash_update(h, obj):
+    """JSON 직렬화가 가능한 값을 해시에 누적 (키 순서 고정)"""
+    h.update(json.dumps(obj, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8'))
+    h.update(b"\x00")
+
+
+def excel_key(data_json, margin_val):
+    """Tab 1 엑셀 키: Gemini 추출 결과 + 마진"""
+    h = hashlib.sha256(b"simple-excel")
+    _hash_update(h, data_json)
+    _hash_update(h, margin_val)
+    return h.hexdigest()
+
+
+def battle_key(policies, options=None):
+    """Tab 2 엑셀 키: 대리점별 분석 데이터 + 필터 + 색상 (등록 순서 포함) + 생성 옵션"""
+    h = hashlib.sha256(b"battle-excel")
+    _hash_update(h, options)
+    for p in policies:
+        _hash_update(h, [p.name, p.color_hex, p.footer_text])
+        if p.df is not None:
+            h.update(p.df.to_json(orient='split', force_ascii=False).encode('utf-8'))
+        _hash_update(h, [
+            list(p.selected_models) if getattr(p, 'selected_models', None) else None,
+            list(p.selected_columns) if getattr(p, 'selected_columns', None) else None,
+            sorted(map(str, p.excluded_cells)) if getattr(p, 'excluded_cells', None) else None,
+        ])
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """
+    메모리에 최근 결과물을 두고, 밀려난 결과물은 디스크로 내린다.
+    디스크도 용량 한도를 넘으면 가장 오래 쓰이지 않은 파일부터 지운다.
+    결과물을 업로드한 공개 URL도 함께 기억해 중복 업로드를 막는다 (결과물이 지워지면 URL도 지움).
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_items=16, max_disk_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()  # key -> bytes
+        self._urls = {}  # key -> 업로드된 공개 URL
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key, ext="bin"):
+        return os.path.join(self.cache_dir, f"{key}.{ext}")
+
+    def get(self, key):
+        """결과물 bytes 반환. 없으면 None"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+
+            if not self.cache_dir:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)  # 디스크 LRU 갱신
+            except OSError:
+                return None
+
+            # 다시 쓰였으므로 메모리로 올림
+            self._remember(key, data)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            self._remember(key, bytes(data))
+
+    def _has_artifact(self, key):
+        return key in self._memory or (self.cache_dir and os.path.exists(self._path(key)))
+
+    def get_url(self, key):
+        """이미 업로드된 결과물의 공개 URL. 없거나 결과물이 캐시에서 지워졌으면 None"""
+        with self._lock:
+            if not self._has_artifact(key):
+                # 결과물 없이 URL만 남은 경우 (재시작 전 메모리에만 있던 결과물 등) → 미스로 보고 정리
+                self._forget_url(key)
+                return None
+            url = self._urls.get(key)
+            if url or not self.cache_dir:
+                return url
+            try:
+                with open(self._path(key, "url"), 'r', encoding='utf-8') as f:
+                    url = f.read().strip() or None
+            except OSError:
+                return None
+            if url:
+                self._urls[key] = url
+            return url
+
+    def set_url(self, key, url):
+        with self._lock:
+            self._urls[key] = url
+            if self.cache_dir:
+                try:
+                    with open(self._path(key, "url"), 'w', encoding='utf-8') as f:
+                        f.write(url)
+                except OSError:
+                    pass
+
+    def _forget_url(self, key):
+        self._urls.pop(key, None)
+        if self.cache_dir:
+            try:
+                os.remove(self._path(key, "url"))
+            except OSError:
+                pass
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            old_key, old_data = self._memory.popitem(last=False)
+            self._spill(old_key, old_data)
+
+    def _spill(self, key, data):
+        """메모리에서 밀려난 결과물을 디스크에 저장"""
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            if not os.path.exists(path):
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            else:
+                os.utime(path)
+        except OSError:
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        names = os.listdir(self.cache_dir)
+        bins = {name[:-4] for name in names if name.endswith(".bin")}
+        for name in names:
+            if name.endswith(".url") and name[:-4] not in bins and name[:-4] not in self._memory:
+                # 결과물이 없는 URL 파일 정리
+                self._forget_url(name[:-4])
+            if not name.endswith(".bin"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+            total += info.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            # 지운 결과물의 URL도 함께 지움 (결과물보다 오래 남지 않도록)
+            self._forget_url(os.path.basename(path)[:-4])
@@ -0,0 +1,364 @@
+import heapq
+
+# --- 배틀 계산 엔진 (엑셀/미리보기 공용) ---
+# pandas는 실제 계산 시점에 로드 (앱 기동 시간 단축)
+# 컬럼명 형식: "Sub|Cond(Plan)" (parse_image_with_gemini_v2 참고)
+
+# 엑셀 헤더 순서와 동일한 4대 핵심 카테고리
+TARGET_CATEGORIES = ["공시(MNP)", "선약(MNP)", "공시(기변)", "선약(기변)"]
+
+# 순위표 열 구성 (ranking_frame)
+RANKING_COLUMNS = ["모델명", "카테고리", "순위", "가격", "요금제", "대리점", "1위와 차이", "다음 순위와 차이"]
+
+# 기존 엑셀 로직과 동일하게 -1 이하의 값은 승자로 인정하지 않음
+NO_PRICE = -1
+
+_INVALID_MODEL_NAMES = ["unknown", "none", "nan"]
+
+
+def classify_column(col):
+    """컬럼명에서 (카테고리, 요금제)를 추출. 4대 카테고리가 아니면 카테고리는 None"""
+    col_str = str(col)
+    plan_name = ""
+
+    # 요금제 추출 (괄호 안의 내용)
+    if "(" in col_str and ")" in col_str:
+        plan_name = col_str.split("(")[-1].replace(")", "")
+
+    category = None
+    if "공시" in col_str:
+        if "MNP" in col_str:
+            category = "공시(MNP)"
+        elif "기변" in col_str:
+            category = "공시(기변)"
+    elif "선약" in col_str:
+        if "MNP" in col_str:
+            category = "선약(MNP)"
+        elif "기변" in col_str:
+            category = "선약(기변)"
+    return category, plan_name
+
+
+def normalize_model_name(idx):
+    """인덱스 값을 배틀용 모델명으로 변환. 무효한 이름이면 None"""
+    if isinstance(idx, (str, int, float)):
+        val_str = str(idx).strip()
+        if val_str and val_str.lower() not in _INVALID_MODEL_NAMES:
+            return val_str
+        return None
+    return str(idx)
+
+
+def row_occurrences(labels):
+    """각 행이 같은 라벨 중 몇 번째인지 (섹션이 나뉜 시세표처럼 같은 모델이 여러 행에 나오는 경우 구분용)"""
+    seen = {}
+    occurrences = []
+    for idx in labels:
+        n = seen.get(idx, 0)
+        seen[idx] = n + 1
+        occurrences.append(n)
+    return occurrences
+
+
+def _model_list(labels):
+    """라벨 목록을 중복 없는 배틀용 모델명 목록으로 (순서 유지)"""
+    models = []
+    seen = set()
+    for idx in labels:
+        name = normalize_model_name(idx)
+        if name and name not in seen:
+            seen.add(name)
+            models.append(name)
+    return models
+
+
+def reduce_policy(df, selected_models=None, selected_columns=None, excluded_cells=None):
+    """
+    정책서 1개를 모델×카테고리 최고값으로 축약.
+    반환: (모델 목록, {모델: {카테고리: (가격, 요금제)}})
+    선택 목록이 비어 있으면 전체를 대상으로 함 (기존 엑셀 로직과 동일)
+    excluded_cells: 승자 후보에서 뺄 칸 {(행 라벨, 순번, 컬럼)} (이상값 검사 결과, 순번은 row_occurrences)
+    """
+    if df is None or df.empty:
+        return [], {}
+    import numpy as np
+    import pandas as pd
+
+    models_to_scan = selected_models if selected_models else df.index
+    models = _model_list(models_to_scan)
+
+    # 동점이면 먼저 스캔한 컬럼이 이기므로 선택 순서대로 스캔
+    cols_to_scan = selected_columns if selected_columns else df.columns
+    row_mask = df.index.isin(list(models_to_scan)) if selected_models else np.ones(len(df), dtype=bool)
+    excluded_rows = {}
+    for label, occurrence, col in excluded_cells or ():
+        excluded_rows.setdefault(col, set()).add((label, occurrence))
+    # 같은 라벨이 여러 행이면 의심 칸이 있는 그 행만 빼도록 (라벨, 순번)으로 비교
+    row_keys = list(zip(df.index, row_occurrences(df.index))) if excluded_rows else None
+
+    best = {}
+    for col in cols_to_scan:
+        if col not in df.columns:
+            continue
+        category, plan_name = classify_column(col)
+        if not category:
+            continue
+
+        mask = row_mask
+        if col in excluded_rows:
+            mask = mask & ~np.array([key in excluded_rows[col] for key in row_keys])
+        values = pd.to_numeric(df[col], errors='coerce')[mask]
+        values = values[values > NO_PRICE]
+        for idx, price in values.items():
+            name = normalize_model_name(idx)
+            if not name:
+                continue
+            cats = best.setdefault(name, {})
+            # 같은 값이면 먼저 나온 컬럼/행 유지
+            if category not in cats or price > cats[category][0]:
+                cats[category] = (float(price), plan_name)
+
+    return models, best
+
+
+def _filter_signature(p):
+    """필터가 바뀌었는지 판단하는 키 (데이터 자체는 객체 동일성으로 비교)"""
+    selected_models = getattr(p, 'selected_models', None)
+    selected_columns = getattr(p, 'selected_columns', None)
+    excluded_cells = getattr(p, 'excluded_cells', None)
+    return (
+        tuple(selected_models) if selected_models else None,
+        tuple(selected_columns) if selected_columns else None,
+        frozenset(excluded_cells) if excluded_cells else None,
+    )
+
+
+class BattleBoard:
+    """
+    대리점별 카테고리 축약 결과를 캐시하고, 필터가 바뀐 대리점의
+    모델들만 승자를 다시 계산하는 증분 계산기.
+    """
+
+    def __init__(self):
+        self._reductions = {}  # policy key -> (df, signature, models, best)
+        self._order = []  # 정책 순서 (동점 시 먼저 등록된 대리점 우선)
+        self._info = {}  # policy key -> (name, color_hex)
+        self._winners = {}  # model -> {category: (price, plan, color_hex, policy_name)}
+        self._model_refs = {}  # model -> 해당 모델을 가진 정책 수
+        self._changes = {}  # 마지막으로 승자가 바뀐 동기화의 (model, category) -> (이전, 이후)
+
+    @staticmethod
+    def _key(p):
+        return getattr(p, 'id', None) or id(p)
+
+    def sync(self, policies):
+        """현재 정책 목록과 동기화. 다시 계산된 모델 집합을 반환"""
+        order = [self._key(p) for p in policies]
+        dirty = set()
+
+        # 제거된 정책
+        for key in list(self._reductions):
+            if key not in order:
+                models = self._reductions.pop(key)[2]
+                self._info.pop(key, None)
+                self._release(models)
+                dirty.update(models)
+
+        # 변경/추가된 정책
+        for p, key in zip(policies, order):
+            info = (p.name, p.color_hex)
+            if self._info.get(key) != info:
+                self._info[key] = info
+                if key in self._reductions:
+                    dirty.update(self._reductions[key][2])
+
+            sig = _filter_signature(p)
+            cached = self._reductions.get(key)
+            if cached and cached[0] is p.df and cached[1] == sig:
+                continue
+
+            patched = self._patch(p, cached, sig) if cached else None
+            if patched:
+                models, best, changed = patched
+                self._release(cached[2])
+                for m in models:
+                    self._model_refs[m] = self._model_refs.get(m, 0) + 1
+                self._reductions[key] = (p.df, sig, models, best)
+                dirty.update(changed)
+                dirty.update(set(cached[2]) ^ set(models))
+                continue
+
+            models, best = reduce_policy(
+                p.df, getattr(p, 'selected_models', None), getattr(p, 'selected_columns', None),
+                getattr(p, 'excluded_cells', None)
+            )
+            if cached:
+                self._release(cached[2])
+                dirty.update(cached[2])
+            for m in models:
+                self._model_refs[m] = self._model_refs.get(m, 0) + 1
+            self._reductions[key] = (p.df, sig, models, best)
+            dirty.update(models)
+
+        # 남아 있는 정책끼리 순서가 바뀌면 동점 처리가 달라지므로 전체 재계산
+        # (추가/제거만 있으면 해당 정책의 모델만 다시 계산하면 됨 - 위에서 dirty에 포함)
+        if order != self._order:
+            current, previous_keys = set(order), set(self._order)
+            if [k for k in order if k in previous_keys] != [k for k in self._order if k in current]:
+                dirty.update(self._model_refs)
+            self._order = order
+
+        previous = {model: self._winners.get(model) for model in dirty}
+        for model in dirty:
+            self._recompute(model)
+        changes = self._diff_winners(previous)
+        if changes:
+            self._changes = changes
+        return dirty
+
+    def _diff_winners(self, previous):
+        empty = (NO_PRICE, "", None, None)
+        changes = {}
+        for model, before in previous.items():
+            after = self._winners.get(model)
+            for cat in TARGET_CATEGORIES:
+                old = before[cat] if before else empty
+                new = after[cat] if after else empty
+                if old != new:
+                    changes[(model, cat)] = (old, new)
+        return changes
+
+    def changes(self):
+        """마지막으로 승자가 바뀐 동기화의 변경분 {(모델, 카테고리): (이전 승자, 새 승자)}"""
+        return self._changes
+
+    @staticmethod
+    def _patch(p, cached, sig):
+        """
+        재업로드 변경 내역(p.last_diff)이 캐시된 데이터 기준이면 바뀐 모델의 행만 다시 축약.
+        조건 선택이 그대로이고 모델 선택 차이가 바뀐 모델 안에 있을 때만 적용, 아니면 None
+        """
+        diff = getattr(p, 'last_diff', None)
+        if diff is None or diff.old_df is not cached[0] or diff.new_df is not p.df or p.df is None:
+            return None
+        if sig[1:] != cached[1][1:]:
+            return None
+        old_models = set(_model_list(cached[1][0])) if cached[1][0] else None
+        new_models = set(_model_list(sig[0])) if sig[0] else None
+        if (old_models is None) != (new_models is None):
+            return None
+        if old_models is not None and not (old_models ^ new_models) <= diff.models:
+            return None
+
+        selected_models = getattr(p, 'selected_models', None)
+        models = _model_list(selected_models if selected_models else p.df.index)
+        changed = diff.models
+        rows = [normalize_model_name(idx) in changed for idx in p.df.index]
+        scoped = [m for m in selected_models if normalize_model_name(m) in changed] if selected_models else None
+        if selected_models and not scoped:
+            part = {}
+        else:
+            _, part = reduce_policy(
+                p.df[rows], scoped, getattr(p, 'selected_columns', None), getattr(p, 'excluded_cells', None)
+            )
+
+        best = {m: cats for m, cats in cached[3].items() if m not in changed}
+        best.update(part)
+        return models, best, changed
+
+    def _release(self, models):
+        for m in models:
+            self._model_refs[m] -= 1
+            if self._model_refs[m] <= 0:
+                del self._model_refs[m]
+
+    def _recompute(self, model):
+        if model not in self._model_refs:
+            self._winners.pop(model, None)
+            return
+
+        best_values = {cat: (NO_PRICE, "", None, None) for cat in TARGET_CATEGORIES}
+        for key in self._order:
+            best = self._reductions[key][3].get(model)
+            if not best:
+                continue
+            name, color = self._info[key]
+            for cat, (price, plan) in best.items():
+                if price > best_values[cat][0]:
+                    best_values[cat] = (price, plan, color, name)
+        self._winners[model] = best_values
+
+    def models(self):
+        """정렬된 전체 모델 목록"""
+        return sorted(self._winners, key=str)
+
+    def winners(self):
+        """{모델: {카테고리: (가격, 요금제, 색상, 대리점명)}}"""
+        return self._winners
+
+    def top_k(self, k=3):
+        """
+        모델×카테고리별 상위 k개 대리점 (대리점당 최고값 1개).
+        반환: {모델: {카테고리: [(가격, 요금제, 색상, 대리점명), ...]}} (가격 내림차순, 동점은 등록 순)
+        """
+        # 전체 모델의 후보를 한 번에 모은 뒤 그룹별로 부분 정렬
+        candidates = {}
+        for order_idx, key in enumerate(self._order):
+            name, color = self._info[key]
+            for model, cats in self._reductions[key][3].items():
+                if model not in self._model_refs:
+                    continue
+                for cat, (price, plan) in cats.items():
+                    candidates.setdefault((model, cat), []).append((price, -order_idx, plan, color, name))
+
+        ranking = {model: {cat: [] for cat in TARGET_CATEGORIES} for model in self._winners}
+        for (model, cat), items in candidates.items():
+            top = heapq.nlargest(k, items, key=lambda item: (item[0], item[1]))
+            ranking[model][cat] = [(price, plan, color, name) for price, _, plan, color, name in top]
+        return ranking
+
+    def ranking_frame(self, k=3):
+        """순위표 DataFrame (1위와 차이 = 1위 가격 - 해당 가격, 다음 순위와 차이 = 해당 가격 - 다음 순위 가격)"""
+        import pandas as pd
+
+        ranking = self.top_k(k)
+        rows = []
+        for model in self.models():
+            for cat in TARGET_CATEGORIES:
+                entries = ranking[model][cat]
+                for rank, (price, plan, _, p_name) in enumerate(entries, 1):
+                    next_price = entries[rank][0] if rank < len(entries) else None
+                    rows.append((
+                        model, cat, rank, price, plan, p_name,
+                        entries[0][0] - price,
+                        price - next_price if next_price is not None else None,
+                    ))
+        return pd.DataFrame(rows, columns=RANKING_COLUMNS)
+
+    def winners_frame(self):
+        """미리보기용 DataFrame (엑셀 메인 시트와 같은 열 구성 + 대리점)"""
+        import pandas as pd
+
+        rows = []
+        for model in self.models():
+            row = {"모델명": model}
+            for cat in TARGET_CATEGORIES:
+                price, plan, _, p_name = self._winners[model][cat]
+                has_price = price != NO_PRICE
+                row[cat] = price if has_price else None
+                row[f"{cat}요금제"] = plan if has_price else ""
+                row[f"{cat}대리점"] = p_name if has_price else ""
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def compute_winners(policies):
+    """정책 목록 전체의 승자를 한 번에 계산 (엑셀 생성용)"""
+    board = BattleBoard()
+    board.sync(policies)
+    return board
+
+
+def rank_top_k(policies, k=3):
+    """정책 목록 전체의 모델×카테고리별 상위 k개 (Python API, ranking_frame 참고)"""
+    return compute_winners(policies).top_k(k)
@@ -0,0 +1,105 @@
+import hashlib
+import threading
+
+from battle_engine import BattleBoard
+from parse_store import frame_from_parsed
+from policy_data import PolicyData
+from policy_diff import canonical_model
+
+# --- 전체 대리점 최고가 뷰 (대리점별 최근 분석 결과 기준) ---
+# 배틀 화면에서 고른 대리점만이 아니라, 분석된 모든 대리점의 최근 결과로 모델×카테고리 최고가를 유지한다.
+# ParseStore에 새 결과가 저장되면(새 분석 / 같은 시세표 재사용 / DB에서 불러오기) 해당 대리점만 다시 축약하고
+# 그 대리점 모델의 승자만 다시 계산한다 (BattleBoard 증분 계산). 조회는 유지된 결과를 바로 돌려준다.
+# 원본은 ParseStore의 대리점별 로컬 캐시이므로 재시작 후에는 첫 조회 때 그대로 다시 구성된다 (Gemini 호출 없음).
+# 모델명은 공백/대소문자 차이를 무시하고 합치며, 처음 나온 표기를 사용한다.
+
+
+def agency_color(name):
+    """대리점명으로 정해지는 밝은 색 (엑셀 승자 칸 배경색)"""
+    digest = hashlib.sha256(str(name).encode('utf-8')).digest()
+    return '#%02X%02X%02X' % tuple(200 + b % 56 for b in digest[:3])
+
+
+class BestPriceView:
+    """ParseStore의 대리점별 최근 결과 전체에 대한 모델×카테고리 최고가 (스레드 안전)"""
+
+    def __init__(self, parse_store):
+        self.parse_store = parse_store
+        self.board = BattleBoard()
+        self.version = 0  # 결과가 바뀔 때마다 증가 (내보내기 캐시 키)
+        self._policies = {}  # 대리점명 -> PolicyData (처음 등록된 순서 = 동점 시 우선순위)
+        self._saved_at = {}  # 대리점명 -> 반영한 결과의 저장 시각
+        self._labels = {}  # 비교용 모델 키 -> 표시할 모델명
+        self._loaded = False
+        self._lock = threading.RLock()
+        parse_store.subscribe(self.update)
+
+    def _ensure_loaded(self):
+        # pandas 로드를 첫 조회까지 미룸 (앱 기동 시간)
+        if self._loaded:
+            return
+        for record in self.parse_store.records():
+            self._apply(record)
+        self._loaded = True
+        self._sync()
+
+    def _canonical(self, df):
+        """행 라벨을 대리점 간 공통 모델명으로 변환"""
+        labels = []
+        for label in df.index:
+            key = canonical_model(label)
+            labels.append(self._labels.setdefault(key, " ".join(str(label).split())) if key else label)
+        return df.set_axis(labels, axis=0)
+
+    def _apply(self, record):
+        name = record["agency_name"]
+        saved_at = record.get("saved_at", 0)
+        if self._saved_at.get(name, -1) >= saved_at:
+            return False
+        df, footer_text = frame_from_parsed(record["parsed"])
+        policy = PolicyData(name=name, image_bytes=None, color_hex=agency_color(name), pages=[])
+        policy.id = name
+        policy.apply_analysis(self._canonical(df), footer_text)
+        self._policies[name] = policy
+        self._saved_at[name] = saved_at
+        return True
+
+    def _sync(self):
+        dirty = self.board.sync(list(self._policies.values()))
+        self.version += 1
+        return dirty
+
+    def update(self, record):
+        """새 결과 반영 (ParseStore 알림). 승자를 다시 계산한 모델 집합 반환"""
+        with self._lock:
+            if not self._loaded:
+                # 아직 조회 전이면 첫 조회 때 ParseStore에서 한꺼번에 읽음
+                return set()
+            if not self._apply(record):
+                return set()
+            return self._sync()
+
+    def agencies(self):
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._policies)
+
+    def updated_at(self):
+        """가장 최근에 반영한 결과의 저장 시각 (없으면 None)"""
+        with self._lock:
+            self._ensure_loaded()
+            return max(self._saved_at.values(), default=None)
+
+    def winners_frame(self):
+        """모델×카테고리 최고가 DataFrame (BattleBoard.winners_frame 형식)"""
+        with self._lock:
+            self._ensure_loaded()
+            return self.board.winners_frame()
+
+    def export_excel(self, top_k=None):
+        """최고의 정책서 엑셀(BytesIO) - 배틀과 같은 양식, 유지된 승자를 그대로 사용"""
+        from excel_builders import create_battle_excel
+
+        with self._lock:
+            self._ensure_loaded()
+            return create_battle_excel(list(self._policies.values()), board=self.board, top_k=top_k)
@@ -0,0 +1,547 @@
+import datetime
+import io
+import math
+import re
+import zipfile
+from functools import lru_cache
+
+from openpyxl import Workbook
+from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.dataframe import dataframe_to_rows
+
+from battle_engine import TARGET_CATEGORIES, NO_PRICE, compute_winners
+
+
+# --- 1. 엑셀 생성 (전쟁 로직) ---
+def create_battle_excel(policies, board=None, top_k=None):
+    wb = Workbook()
+    
+    # 1. 시트 생성
+    ws_main = wb.active
+    ws_main.title = "🏆최고의 정책서"
+    
+    # --- [New] 대리점별 추가정책 입력칸 생성 (Row 1~2) ---
+    # Row 1: 대리점명
+    # Row 2: 추가정책 값 (기본 0)
+    # Map: policy_name -> cell_coordinate (e.g., "AgencyA" -> "$B$2")
+    
+    agency_adj_map = {}
+    current_adj_col = 2
+    
+    ws_main.cell(row=1, column=1, value="대리점 추가정책")
+    ws_main.cell(row=2, column=1, value="입력값(원)")
+    
+    for p in policies:
+        cell_name = ws_main.cell(row=1, column=current_adj_col, value=p.name)
+        cell_val = ws_main.cell(row=2, column=current_adj_col, value=0) # 기본값 0
+        
+        # 스타일링
+        cell_name.fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid") # 노란색
+        cell_name.alignment = Alignment(horizontal='center')
+        cell_val.alignment = Alignment(horizontal='center')
+        
+        # 좌표 저장 (절대참조)
+        col_letter = cell_val.column_letter
+        agency_adj_map[p.name] = f"${col_letter}$2"
+        
+        current_adj_col += 1
+        
+    # 메인 테이블 시작 Row
+    start_row = 4
+    
+    # --- 동적 통합 로직 (battle_engine에서 대리점별 축약 후 승자 계산) ---
+    if board is None:
+        board = compute_winners(policies)
+    winners = board.winners()
+    combined_index = board.models()
+    
+    # --- 헤더 작성 (4대 핵심 정책 + 요금제) ---
+    # 순서: 모델명, 공시(MNP), 선약(MNP), 공시(기변), 선약(기변)
+    headers = [
+        "모델명", 
+        "공시(MNP)", "공시(MNP)요금제", 
+        "선약(MNP)", "선약(MNP)요금제", 
+        "공시(기변)", "공시(기변)요금제", 
+        "선약(기변)", "선약(기변)요금제"
+    ]
+    
+    for c_idx, header in enumerate(headers, 1):
+        cell = ws_main.cell(row=start_row, column=c_idx, value=header)
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+        cell.fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
+        cell.font = Font(bold=True)
+        
+    center_align = Alignment(horizontal='center', vertical='center')
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+    
+    # Row 순회 (모델별)
+    for r_idx, model in enumerate(combined_index, start_row + 1):
+        ws_main.cell(row=r_idx, column=1, value=model).border = thin_border
+        
+        # 구조: {category: (max_price, best_plan, color_hex, policy_name)}
+        best_values = winners[model]
+        
+        # 결과 작성 (TARGET_CATEGORIES 순서 = headers 순서)
+        current_col = 2
+        for cat in TARGET_CATEGORIES:
+            price, plan, color, p_name = best_values[cat]
+            
+            # 가격 셀
+            cell_price = ws_main.cell(row=r_idx, column=current_col)
+            cell_price.border = thin_border
+            cell_price.alignment = center_align
+            
+            # 요금제 셀
+            cell_plan = ws_main.cell(row=r_idx, column=current_col + 1)
+            cell_plan.border = thin_border
+            cell_plan.alignment = center_align
+            
+            if price != NO_PRICE:
+                # [New] 수식 적용: =기본값 + 대리점추가정책셀
+                if p_name and p_name in agency_adj_map:
+                    adj_cell_ref = agency_adj_map[p_name]
+                    cell_price.value = f"={price}+{adj_cell_ref}"
+                else:
+                    cell_price.value = price
+                
+                cell_plan.value = plan
+                
+                # 배경색 적용 (가격 셀에만)
+                if color:
+                    # #RRGGBB -> RRGGBB
+                    clean_hex = color.lstrip('#')
+                    if len(clean_hex) == 6:
+                        cell_price.fill = PatternFill(start_color=clean_hex, end_color=clean_hex, fill_type="solid")
+            else:
+                cell_price.value = "" 
+                cell_plan.value = ""
+            
+            current_col += 2
+
+    # 4. 하단 조건문 동적 조립
+    current_row = len(combined_index) + start_row + 2
+    ws_main.cell(row=current_row, column=1, value="[가입 조건 및 유의사항]")
+    current_row += 1
+    
+    for p in policies:
+        if p.footer_text:
+            ws_main.cell(row=current_row, column=1, value=f"■ {p.name}: {p.footer_text}")
+            current_row += 1
+            
+    # 4-1. [선택] 순위 시트: 모델×카테고리별 상위 top_k 대리점과 1위와의 차이
+    if top_k:
+        ws_rank = wb.create_sheet(title=f"📊순위(Top{top_k})")
+        ranking = board.ranking_frame(top_k)
+        for c_idx, header in enumerate(ranking.columns, 1):
+            cell = ws_rank.cell(row=1, column=c_idx, value=header)
+            cell.alignment = center_align
+            cell.fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
+            cell.font = Font(bold=True)
+
+        agency_colors = {p.name: p.color_hex for p in policies}
+        for r_idx, row_data in enumerate(ranking.itertuples(index=False), 2):
+            for c_idx, val in enumerate(row_data, 1):
+                if val is None or (isinstance(val, float) and math.isnan(val)):
+                    val = ""
+                cell = ws_rank.cell(row=r_idx, column=c_idx, value=val)
+                cell.border = thin_border
+                cell.alignment = center_align
+
+            # 대리점 색상 (가격 셀에만)
+            clean_hex = (agency_colors.get(row_data[5]) or "").lstrip('#')
+            if len(clean_hex) == 6:
+                ws_rank.cell(row=r_idx, column=4).fill = PatternFill(start_color=clean_hex, end_color=clean_hex, fill_type="solid")
+
+    # 5. 원본 데이터 시트 (수식 적용)
+    for p in policies:
+        ws_raw = wb.create_sheet(title=f"원본_{p.name}")
+        
+        # [New] 전체 추가정책 입력칸
+        ws_raw.cell(row=1, column=1, value="전체 추가정책")
+        ws_raw.cell(row=1, column=2, value="입력값(원)")
+        ws_raw.cell(row=1, column=3, value=0) # C1: 입력값
+        adj_cell_ref = "$C$1"
+        
+        # 스타일링
+        ws_raw.cell(row=1, column=3).fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+        
+        # 데이터프레임 헤더 및 데이터 쓰기
+        rows = list(dataframe_to_rows(p.df, index=True, header=True))
+        
+        start_row_raw = 3
+        
+        # rows[0] is the header row
+        # rows[1:] are data rows
+        
+        if not rows:
+            continue
+
+        # 헤더 쓰기 (Row 3)
+        for c_idx, val in enumerate(rows[0], 1):
+            ws_raw.cell(row=start_row_raw, column=c_idx, value=val)
+            
+        # 데이터 쓰기 (Row 4~)
+        for r_idx, row_data in enumerate(rows[1:], start_row_raw + 1):
+            for c_idx, val in enumerate(row_data, 1):
+                cell = ws_raw.cell(row=r_idx, column=c_idx)
+                
+                # 첫 번째 컬럼(모델명)은 그대로
+                if c_idx == 1:
+                    cell.value = val
+                else:
+                    # 가격 컬럼은 수식 적용
+                    # NaN 체크: pd.isna(val) or math.isnan(val)
+                    try:
+                        if val is not None and val != "":
+                            # 문자열인 경우도 있으므로 float 변환 시도
+                            float_val = float(val)
+                            
+                            # NaN인지 확인 (math.isnan은 float에만 동작)
+                            if not math.isnan(float_val):
+                                cell.value = f"={float_val}+{adj_cell_ref}"
+                            else:
+                                cell.value = "" # NaN이면 빈칸
+                        else:
+                            cell.value = "" # None/Empty면 빈칸
+                    except (ValueError, TypeError):
+                        # 숫자가 아닌 경우 (예: 텍스트) 그대로 출력
+                        cell.value = val
+                        
+        last_row = start_row_raw + len(rows)
+        ws_raw.cell(row=last_row + 2, column=1, value="조건문 원본:")
+        ws_raw.cell(row=last_row + 3, column=1, value=p.footer_text)
+
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+# --- 2. 엑셀 생성 함수 (사용자 요청 스타일 적용) ---
+TOP_HEADERS = ["모델","출고가","공시지원금","SK_번이","SK_기변","SK_카드_번이","SK_카드_기변","KT_번이","KT_기변","KT_카드_번이","KT_카드_기변","LG_번이","LG_기변","LG_카드_번이","LG_카드_기변"]
+BOTTOM_HEADERS = ["통신사", "부가서비스조건", "월요금", "유지기간", "미가입시추가금"]
+BOTTOM_COL_RANGES = [(1,3), (4,8), (9,10), (11,12), (13,15)] # 하단 조건표 열 병합 범위
+
+# openpyxl로 셀마다 스타일을 입히는 원본 구현. 템플릿 렌더러(2-1)의 견본 생성과 예외 값 처리에 사용
+def _create_excel_bytes_openpyxl(data_json, margin_val):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "성지 통합 시세표"
+
+    # 스타일 정의
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+    header_fill = PatternFill(start_color="DDDDDD", end_color="DDDDDD", fill_type="solid")
+    header_font = Font(bold=True)
+    center_align = Alignment(horizontal='center', vertical='center')
+    
+    # 1. 상단 시세표 그리기
+    top_headers = TOP_HEADERS
+    
+    for col_idx, text in enumerate(top_headers, start=1):
+        cell = ws.cell(row=1, column=col_idx, value=text)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = center_align
+        cell.border = thin_border
+
+    current_row = 2
+    top_data = data_json.get("top_data", [])
+    
+    if top_data:
+        for row_data in top_data:
+            # 데이터 길이가 헤더보다 짧을 경우를 대비해 패딩
+            row_data = row_data + [None] * (len(top_headers) - len(row_data))
+            
+            # 앞 3열 (모델, 출고가, 공시지원금) - 그대로 출력
+            for c in range(3):
+                cell = ws.cell(row=current_row, column=c+1, value=row_data[c])
+                cell.alignment = center_align
+                cell.border = thin_border
+            
+            # 나머지 열 (가격 정보) - 마진 수식 적용
+            for c in range(3, 15):
+                val = row_data[c]
+                cell = ws.cell(row=current_row, column=c+1)
+                
+                # 숫자인 경우에만 수식 적용, 아니면 그대로 값 출력
+                if isinstance(val, (int, float)):
+                    cell.value = f"={val}-$Q$2"
+                elif val is not None and str(val).replace('-','').isdigit(): # 문자열이지만 숫자인 경우
+                     cell.value = f"={val}-$Q$2"
+                else:
+                    cell.value = val if val is not None else ""
+                    
+                cell.alignment = center_align
+                cell.border = thin_border
+            current_row += 1
+
+    # 2. 중간 안내 문구
+    current_row += 1
+    ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=15)
+    msg_cell = ws.cell(row=current_row, column=1, value="위 표시 금액은 현금완납가격 입니다. 카드결제도 가능합니다.")
+    msg_cell.font = Font(color="FF0000", bold=True, size=14)
+    msg_cell.alignment = center_align
+    current_row += 2
+
+    # 3. 하단 조건표 그리기
+    bottom_headers = BOTTOM_HEADERS
+    bottom_col_ranges = BOTTOM_COL_RANGES # 열 병합 범위
+    
+    # 헤더 출력
+    for idx, (sc, ec) in enumerate(bottom_col_ranges):
+        ws.merge_cells(start_row=current_row, start_column=sc, end_row=current_row, end_column=ec)
+        cell = ws.cell(row=current_row, column=sc, value=bottom_headers[idx])
+        cell.fill = PatternFill(start_color="E2EFDA", end_color="E2EFDA", fill_type="solid")
+        cell.font = header_font
+        cell.alignment = center_align
+        for c in range(sc, ec+1):
+            ws.cell(row=current_row, column=c).border = thin_border
+    current_row += 1
+
+    # 데이터 출력
+    bottom_data = data_json.get("bottom_data", [])
+    start_data_row = current_row
+    
+    if bottom_data:
+        for row_data in bottom_data:
+            # 데이터 패딩
+            row_data = row_data + [""] * (len(bottom_headers) - len(row_data))
+            
+            for idx, (sc, ec) in enumerate(bottom_col_ranges):
+                ws.merge_cells(start_row=current_row, start_column=sc, end_row=current_row, end_column=ec)
+                cell = ws.cell(row=current_row, column=sc, value=row_data[idx])
+                cell.alignment = center_align
+                for c in range(sc, ec+1):
+                    ws.cell(row=current_row, column=c).border = thin_border
+            current_row += 1
+        
+        # 통신사별 병합 (데이터가 10줄이라고 가정하고 3/3/4 등으로 나눔, 혹은 데이터 내용 기반)
+        # 여기서는 사용자가 준 예시처럼 SK(3줄), KT(3줄), LG(3줄) 정도로 가정하되, 
+        # 실제 데이터가 가변적일 수 있으므로 통신사 텍스트가 같은 것끼리 묶는 로직이 이상적이나
+        # 우선 사용자 예시 코드의 하드코딩된 병합 로직을 최대한 따르되 안전장치 추가
+        
+        # (간단히 3등분 로직 대신, 첫번째 컬럼 값이 같으면 병합하는 로직은 복잡하므로 
+        #  사용자 예시처럼 SK/KT/LG 순서대로 데이터가 온다고 가정하고 렌더링)
+        pass 
+
+    # 4. 맨 밑 유의사항 추가
+    current_row += 1 
+    footer_font = Font(size=9, color="333333") 
+    footer_fill = PatternFill(start_color="F2F2F2", end_color="F2F2F2", fill_type="solid") 
+    footer_align = Alignment(horizontal='center', vertical='center', wrap_text=True) 
+
+    footer_lines = data_json.get("footer_lines", [])
+    if footer_lines:
+        for line in footer_lines:
+            ws.merge_cells(start_row=current_row, start_column=1, end_row=current_row, end_column=15)
+            cell = ws.cell(row=current_row, column=1, value=line)
+            cell.font = footer_font
+            cell.fill = footer_fill
+            cell.alignment = footer_align
+            
+            for c in range(1, 16):
+                ws.cell(row=current_row, column=c).border = thin_border
+            current_row += 1
+
+    # 5. 마진 설정 컨트롤러
+    ws['Q1'] = "추가 마진 설정(만원)"
+    ws['Q1'].fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
+    ws['Q1'].font = Font(color="FFFFFF", bold=True)
+    ws.column_dimensions['Q'].width = 20
+    ws['Q2'] = margin_val
+    ws['Q2'].alignment = center_align
+    ws['Q2'].font = Font(bold=True, size=14)
+
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+# --- 2-1. Tab 1 시세표 템플릿 렌더러 ---
+# 헤더/안내 문구/조건표 헤더/Q1·Q2 마진 칸과 styles.xml 등 패키지 파일은 바뀌지 않으므로
+# 원본 구현(2)으로 견본을 한 번 만들어 재사용하고, 데이터 행만 sheet1.xml 문자열로 이어 붙인다.
+# 셀 스타일 번호도 견본에서 읽어 오므로 결과 파일은 원본 구현과 같다 (docProps/core.xml의 시각 제외).
+# 템플릿이 다루지 않는 값(bool, NaN, 오류 코드, 제어문자 등)이 있으면 원본 구현으로 만든다.
+
+_COLUMN_LETTERS = [get_column_letter(c) for c in range(1, 18)]
+_CELL_STYLE_RE = re.compile(r'<c r="([A-Z]+)(\d+)" s="(\d+)"')
+_CORE_TIME_RE = re.compile(r'(<dcterms:(?:created|modified)[^>]*>)[^<]*')
+_SHEET_PART = "xl/worksheets/sheet1.xml"
+_CORE_PART = "docProps/core.xml"
+
+
+class _TemplateMiss(Exception):
+    """템플릿으로 쓸 수 없는 값 → 원본 구현 사용"""
+
+
+def _layout(n_top, n_bottom):
+    """(안내 문구 행, 조건표 헤더 행, 조건표 첫 데이터 행, 유의사항 첫 행) - 원본 구현과 같은 배치"""
+    msg_row = n_top + 3
+    bottom_header_row = msg_row + 2
+    return msg_row, bottom_header_row, bottom_header_row + 1, bottom_header_row + n_bottom + 2
+
+
+def _xml_text(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _cell_xml(ref, style, value):
+    """openpyxl 셀 기록과 같은 <c> 요소 문자열"""
+    kind = type(value)
+    if value is None:
+        return f'<c r="{ref}" s="{style}" t="n" />'
+    if kind is str:
+        if len(value) > 32767 or value in ERROR_CODES or ILLEGAL_CHARACTERS_RE.search(value):
+            raise _TemplateMiss(ref)
+        if value == "":
+            return f'<c r="{ref}" s="{style}" t="inlineStr" />'
+        if len(value) > 1 and value[0] == "=":
+            return f'<c r="{ref}" s="{style}"><f>{_xml_text(value[1:])}</f><v /></c>'
+        stripped = value.strip()
+        space = ' xml:space="preserve"' if stripped and stripped != value else ""
+        return f'<c r="{ref}" s="{style}" t="inlineStr"><is><t{space}>{_xml_text(value)}</t></is></c>'
+    if kind is int or (kind is float and math.isfinite(value)):
+        return f'<c r="{ref}" s="{style}" t="n"><v>{"%.16g" % value}</v></c>'
+    raise _TemplateMiss(ref)
+
+
+def _row_template(row_xml, row):
+    """견본 행 XML을 행 번호 자리로 나눈 조각 목록 (str(r).join(조각)으로 복원)"""
+    return re.sub(rf'r="([A-Z]*){row}"', r'r="\1' + "\x00" + '"', row_xml).split("\x00")
+
+
+@lru_cache(maxsize=None)
+def _excel_template(has_top, has_bottom, has_footer):
+    """섹션 유무 조합별 템플릿: 견본 1행씩으로 원본 구현을 실행해 고정 부분과 스타일 번호를 추출"""
+    sample = {
+        "top_data": [["견본"]] if has_top else [],
+        "bottom_data": [["견본"]] if has_bottom else [],
+        "footer_lines": ["견본"] if has_footer else [],
+    }
+    with zipfile.ZipFile(_create_excel_bytes_openpyxl(sample, 0)) as archive:
+        parts = [(name, archive.read(name)) for name in archive.namelist()]
+    sheet = dict(parts)[_SHEET_PART].decode("utf-8")
+    core = dict(parts)[_CORE_PART].decode("utf-8")
+
+    msg_row, bottom_header_row, bottom_row, footer_row = _layout(int(has_top), int(has_bottom))
+    styles = {(col, int(row)): s for col, row, s in _CELL_STYLE_RE.findall(sheet)}
+    rows = {int(m.group(1)): m.group(0) for m in re.finditer(r'<row r="(\d+)">.*?</row>', sheet)}
+    head, _, rest = sheet.partition("<sheetData>")
+    tail = rest[rest.index("<pageMargins"):]
+
+    return {
+        "parts": parts,
+        "head": re.sub(r'<dimension ref="[^"]*" />', '<dimension ref="\x00" />', head).split("\x00"),
+        "tail": tail,
+        "core": _CORE_TIME_RE.sub("\\1\x00", core).split("\x00"),
+        "row1": rows[1],
+        "msg_row": _row_template(rows[msg_row], msg_row),
+        "bottom_header_row": _row_template(rows[bottom_header_row], bottom_header_row),
+        "data": styles.get(("A", 2)) if has_top else None,
+        "q2": styles[("Q", 2)],
+        "merged": styles[("B", bottom_header_row)],
+        "bottom": styles[("A", bottom_row)] if has_bottom else None,
+        "footer": styles[("A", footer_row)] if has_footer else None,
+    }
+
+
+def _render_excel_bytes(data_json, margin_val):
+    """템플릿으로 Tab 1 시세표 엑셀 생성. 다루지 않는 값이 있으면 _TemplateMiss"""
+    top_data = data_json.get("top_data", []) or []
+    bottom_data = data_json.get("bottom_data", []) or []
+    footer_lines = data_json.get("footer_lines", []) or []
+    if not all(type(section) is list for section in (top_data, bottom_data, footer_lines)):
+        raise _TemplateMiss("section")
+
+    t = _excel_template(bool(top_data), bool(bottom_data), bool(footer_lines))
+    letters = _COLUMN_LETTERS
+    n_cols = len(TOP_HEADERS)
+    out = [t["row1"]]
+    q2 = _cell_xml("Q2", t["q2"], margin_val)
+
+    # 1. 상단 시세표: 앞 3열은 값 그대로, 가격 열은 마진 수식
+    s_data = t["data"]
+    for r, row_data in enumerate(top_data, start=2):
+        if type(row_data) is not list:
+            raise _TemplateMiss("top_data")
+        row_data = row_data + [None] * (n_cols - len(row_data))
+        cells = [f'<row r="{r}">']
+        for c in range(3):
+            cells.append(_cell_xml(f"{letters[c]}{r}", s_data, row_data[c]))
+        for c in range(3, n_cols):
+            val = row_data[c]
+            if isinstance(val, (int, float)) or (val is not None and str(val).replace('-', '').isdigit()):
+                val = f"={val}-$Q$2"
+            elif val is None:
+                val = ""
+            cells.append(_cell_xml(f"{letters[c]}{r}", s_data, val))
+        if r == 2:
+            cells.append(q2)
+        cells.append("</row>")
+        out.append("".join(cells))
+    if not top_data:
+        out.append(f'<row r="2">{q2}</row>')
+
+    # 2. 안내 문구 / 3. 하단 조건표 헤더 (고정)
+    msg_row, bottom_header_row, bottom_row, footer_row = _layout(len(top_data), len(bottom_data))
+    out.append(str(msg_row).join(t["msg_row"]))
+    out.append(str(bottom_header_row).join(t["bottom_header_row"]))
+    # openpyxl과 같은 mergeCells 순서를 위해 CellRange와 해시가 같은 튜플을 같은 순서로 set에 넣는다
+    merges = {(msg_row, 1, msg_row, 15)}
+    merges.update((bottom_header_row, sc, bottom_header_row, ec) for sc, ec in BOTTOM_COL_RANGES)
+
+    # 3. 하단 조건표 데이터: 병합 범위 첫 칸에 값, 나머지 칸은 테두리만
+    s_bottom, s_merged = t["bottom"], t["merged"]
+    for r, row_data in enumerate(bottom_data, start=bottom_row):
+        if type(row_data) is not list:
+            raise _TemplateMiss("bottom_data")
+        row_data = row_data + [""] * (len(BOTTOM_HEADERS) - len(row_data))
+        cells = [f'<row r="{r}">']
+        for idx, (sc, ec) in enumerate(BOTTOM_COL_RANGES):
+            merges.add((r, sc, r, ec))
+            cells.append(_cell_xml(f"{letters[sc - 1]}{r}", s_bottom, row_data[idx]))
+            cells.extend(f'<c r="{letters[c - 1]}{r}" s="{s_merged}" t="n" />' for c in range(sc + 1, ec + 1))
+        cells.append("</row>")
+        out.append("".join(cells))
+
+    # 4. 맨 밑 유의사항
+    s_footer = t["footer"]
+    last_row = bottom_row + len(bottom_data) - 1 if bottom_data else bottom_header_row
+    for r, line in enumerate(footer_lines, start=footer_row):
+        merges.add((r, 1, r, 15))
+        cells = [f'<row r="{r}">', _cell_xml(f"A{r}", s_footer, line)]
+        cells.extend(f'<c r="{letters[c]}{r}" s="{s_merged}" t="n" />' for c in range(1, n_cols))
+        cells.append("</row>")
+        out.append("".join(cells))
+        last_row = r
+
+    merge_xml = "".join(
+        f'<mergeCell ref="{letters[c1 - 1]}{r1}:{letters[c2 - 1]}{r2}" />' for r1, c1, r2, c2 in merges
+    )
+    sheet = "".join([
+        f"A1:Q{last_row}".join(t["head"]), "<sheetData>", *out, "</sheetData>",
+        f'<mergeCells count="{len(merges)}">{merge_xml}</mergeCells>', t["tail"],
+    ])
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for name, data in t["parts"]:
+            if name == _SHEET_PART:
+                data = sheet.encode("utf-8")
+            elif name == _CORE_PART:
+                data = stamp.join(t["core"]).encode("utf-8")
+            archive.writestr(name, data)
+    output.seek(0)
+    return output
+
+
+def create_excel_bytes(data_json, margin_val):
+    """Tab 1 시세표 엑셀(BytesIO). 템플릿 렌더러를 쓰고, 다루지 않는 값이 있으면 openpyxl 원본 구현"""
+    try:
+        return _render_excel_bytes(data_json, margin_val)
+    except _TemplateMiss:
+        return _create_excel_bytes_openpyxl(data_json, margin_val)
@@ -0,0 +1,105 @@
+import importlib.util
+import io
+
+from battle_engine import TARGET_CATEGORIES, NO_PRICE, BattleBoard, compute_winners
+
+# --- 기계용 내보내기 (CSV / JSON Lines / Parquet) ---
+# POS·가격게시 스크립트가 엑셀을 다시 파싱하지 않도록 계산된 데이터를 그대로 내보낸다.
+# pandas는 실제 내보내기 시점에 로드한다.
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+WINNER_COLUMNS = ["model", "category", "price", "plan", "agency"]
+
+
+def available_formats():
+    """현재 환경에서 쓸 수 있는 형식 목록 (parquet은 pyarrow/fastparquet 필요)"""
+    formats = ["csv", "jsonl"]
+    if importlib.util.find_spec("pyarrow") or importlib.util.find_spec("fastparquet"):
+        formats.append("parquet")
+    return formats
+
+
+def winners_frame(policies_or_board):
+    """승자 목록을 long 형식 DataFrame으로 (model, category, price, plan, agency)"""
+    import pandas as pd
+
+    if isinstance(policies_or_board, BattleBoard):
+        board = policies_or_board
+    else:
+        board = compute_winners(policies_or_board)
+
+    winners = board.winners()
+    rows = []
+    for model in board.models():
+        for cat in TARGET_CATEGORIES:
+            price, plan, _, p_name = winners[model][cat]
+            if price == NO_PRICE:
+                continue
+            rows.append((model, cat, price, plan, p_name))
+    return pd.DataFrame(rows, columns=WINNER_COLUMNS)
+
+
+def winner_changes_frame(board_or_changes):
+    """
+    마지막 동기화에서 바뀐 승자만 담은 DataFrame (WINNER_COLUMNS와 같은 열).
+    board 대신 board.changes() 결과를 넘겨도 된다 (그 시점의 변경분으로 고정).
+    더 이상 가격이 없는 항목은 price/plan/agency가 비어 있다 (받는 쪽에서 삭제로 처리).
+    """
+    import pandas as pd
+
+    changes = board_or_changes.changes() if isinstance(board_or_changes, BattleBoard) else board_or_changes
+    rows = []
+    for (model, cat), (_, new) in sorted(changes.items()):
+        price, plan, _, p_name = new
+        if price == NO_PRICE:
+            rows.append((model, cat, None, "", ""))
+        else:
+            rows.append((model, cat, price, plan, p_name))
+    return pd.DataFrame(rows, columns=WINNER_COLUMNS)
+
+
+def policy_frame(policy):
+    """대리점 원본 분석 결과를 Model 컬럼이 있는 평평한 DataFrame으로"""
+    if policy.df is None:
+        import pandas as pd
+
+        return pd.DataFrame(columns=["Model"])
+    df = policy.df.copy()
+    df.index.name = "Model"
+    df = df.reset_index()
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+def frame_to_bytes(df, fmt):
+    """DataFrame을 지정 형식의 bytes로 직렬화"""
+    if fmt == "csv":
+        # 엑셀에서 열어도 한글이 깨지지 않도록 BOM 포함
+        return df.to_csv(index=False).encode('utf-8-sig')
+    if fmt == "jsonl":
+        return df.to_json(orient='records', lines=True, force_ascii=False).encode('utf-8')
+    if fmt == "parquet":
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+    raise ValueError(f"지원하지 않는 형식입니다: {fmt}")
+
+
+def export_winners(policies_or_board, fmt="csv"):
+    """배틀 승자 목록을 bytes로 내보내기"""
+    return frame_to_bytes(winners_frame(policies_or_board), fmt)
+
+
+def export_winner_changes(board_or_changes, fmt="csv"):
+    """마지막으로 바뀐 승자만 bytes로 내보내기 (전체 재생성 없이 변경분 반영용)"""
+    return frame_to_bytes(winner_changes_frame(board_or_changes), fmt)
+
+
+def export_policy(policy, fmt="csv"):
+    """대리점 원본 분석 결과를 bytes로 내보내기"""
+    return frame_to_bytes(policy_frame(policy), fmt)
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+# --- 이미지 → 텍스트 추출 백엔드 (Gemini 실호출 / 녹화 / 재생 / 가짜) ---
+# 모든 백엔드는 generate(prompt, image_bytes, mime_type, safety_settings=None) -> 응답 텍스트
+# 여러 이미지를 한 요청으로 보낼 때는 generate_parts(parts, safety_settings=None)
+#   parts: 텍스트(str)와 이미지((bytes, mime_type))를 보낼 순서대로 나열한 목록
+# 환경변수로 선택:
+#   SUNGZIDANG_EXTRACTOR=live|record|replay|fake (기본 live)
+#   SUNGZIDANG_RECORDINGS=녹화 폴더 (기본 .cache/recordings)
+#   SUNGZIDANG_REPLAY_LATENCY=재생 지연(초) 또는 "recorded" (녹화 당시 지연 재현)
+#   SUNGZIDANG_FAKE_LATENCY=가짜 응답 지연(초), SUNGZIDANG_FAKE_429=429 오류 비율 (0~1)
+
+DEFAULT_RECORDINGS_DIR = os.path.join(".cache", "recordings")
+
+
+class RecordingNotFound(KeyError):
+    """재생할 녹화가 없음"""
+
+
+def recording_key(prompt, image_bytes):
+    """이미지 해시 + 프롬프트 해시로 녹화 키 생성"""
+    image_hash = hashlib.sha256(image_bytes).hexdigest()
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    return f"{image_hash[:32]}_{prompt_hash[:16]}"
+
+
+def parts_key(parts):
+    """여러 파트 요청의 녹화 키 (텍스트는 이어 붙이고, 이미지는 해시를 이어 붙임)"""
+    texts = "\n".join(part for part in parts if isinstance(part, str))
+    images = b"".join(hashlib.sha256(part[0]).digest() for part in parts if not isinstance(part, str))
+    return recording_key(texts, images)
+
+
+class GeminiExtractor:
+    """실제 Gemini API 호출"""
+
+    def __init__(self, api_key, model_name):
+        self.api_key = api_key
+        self.model_name = model_name
+
+    def generate(self, prompt, image_bytes, mime_type, safety_settings=None):
+        return self.generate_parts([prompt, (image_bytes, mime_type)], safety_settings)
+
+    def generate_parts(self, parts, safety_settings=None):
+        import google.generativeai as genai
+
+        genai.configure(api_key=self.api_key)
+        model = genai.GenerativeModel(self.model_name)
+        kwargs = {"safety_settings": safety_settings} if safety_settings else {}
+        contents = [
+            part if isinstance(part, str) else {"mime_type": part[1], "data": part[0]}
+            for part in parts
+        ]
+        response = model.generate_content(contents, **kwargs)
+        return response.text
+
+
+class RecordingExtractor:
+    """다른 백엔드의 응답을 녹화 폴더에 저장하면서 그대로 반환"""
+
+    def __init__(self, inner, recordings_dir=DEFAULT_RECORDINGS_DIR):
+        self.inner = inner
+        self.recordings_dir = recordings_dir
+        os.makedirs(recordings_dir, exist_ok=True)
+
+    def generate(self, prompt, image_bytes, mime_type, safety_settings=None):
+        started = time.time()
+        text = self.inner.generate(prompt, image_bytes, mime_type, safety_settings)
+        return self._record(recording_key(prompt, image_bytes), mime_type, started, text)
+
+    def generate_parts(self, parts, safety_settings=None):
+        started = time.time()
+        text = self.inner.generate_parts(parts, safety_settings)
+        mime_types = [part[1] for part in parts if not isinstance(part, str)]
+        return self._record(parts_key(parts), mime_types, started, text)
+
+    def _record(self, key, mime_type, started, text):
+        record = {
+            "model": getattr(self.inner, "model_name", None),
+            "mime_type": mime_type,
+            "latency": round(time.time() - started, 3),
+            "text": text,
+        }
+        path = os.path.join(self.recordings_dir, f"{key}.json")
+        tmp_path = f"{path}.tmp.{threading.get_ident()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return text
+
+
+class ReplayExtractor:
+    """녹화된 응답을 오프라인으로 재생 (latency: 초 단위 또는 "recorded")"""
+
+    def __init__(self, recordings_dir=DEFAULT_RECORDINGS_DIR, latency=0.0):
+        self.recordings_dir = recordings_dir
+        self.latency = latency
+        self.model_name = "replay"
+
+    def generate(self, prompt, image_bytes, mime_type, safety_settings=None):
+        return self._replay(recording_key(prompt, image_bytes))
+
+    def generate_parts(self, parts, safety_settings=None):
+        return self._replay(parts_key(parts))
+
+    def _replay(self, key):
+        path = os.path.join(self.recordings_dir, f"{key}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            raise RecordingNotFound(f"녹화된 응답이 없습니다: {key}") from None
+
+        delay = record.get("latency", 0.0) if self.latency == "recorded" else self.latency
+        if delay:
+            time.sleep(delay)
+        return record["text"]
+
+
+# 가짜 시세표 생성용 값
+_FAKE_MODELS = [
+    "갤럭시 S24", "갤럭시 S24+", "갤럭시 S24 울트라", "갤럭시 Z 플립6", "갤럭시 Z 폴드6",
+    "갤럭시 A35", "갤럭시 A25", "갤럭시 퀀텀5", "아이폰 15", "아이폰 15 Plus",
+    "아이폰 15 Pro", "아이폰 15 Pro Max", "아이폰 16", "아이폰 16 Pro", "아이폰 16 Pro Max",
+    "갤럭시 S23 FE", "갤럭시 버디3", "갤럭시 와이드7", "갤럭시 Z 플립5", "갤럭시 Z 폴드5",
+]
+_FAKE_CONDITIONS = ["공시 MNP", "선약 MNP", "공시 기변", "선약 기변"]
+_FAKE_PLANS = ["5GX 프라임", "5GX 프리미엄(T우주)"]
+
+
+def _fake_battle_sheet(rng):
+    columns = [
+        {"sub_agency": sub, "condition": cond, "plan": plan}
+        for sub in ["I", "J"] for cond in _FAKE_CONDITIONS for plan in _FAKE_PLANS
+    ]
+    rows = []
+    for model in rng.sample(_FAKE_MODELS, 16):
+        rows.append([model] + [rng.randint(-10, 60) if rng.random() > 0.2 else None for _ in columns])
+    return {"columns": columns, "rows": rows, "footer": "※ 부가서비스 3개월 유지 / 카드 결합 조건 별도 (가짜 응답)"}
+
+
+def _fake_ocr_sheet(rng):
+    top_data = []
+    for model in rng.sample(_FAKE_MODELS, 15):
+        factory = rng.choice([99.0, 115.5, 135.3, 148.5, 199.8])
+        top_data.append([model, factory, rng.randint(10, 60)] + [rng.randint(-45, 40) for _ in range(12)])
+    bottom_data = [
+        [carrier, "요금제: 프라임", "89,000원", "6개월", "500,000원"] for carrier in ["SK(24개월)", "KT(24개월)", "LG(24개월)"]
+    ]
+    return {"top_data": top_data, "bottom_data": bottom_data, "footer_lines": ["가짜 응답입니다.", "부가서비스 3개월 유지"]}
+
+
+class FakeExtractor:
+    """
+    합성 시세표 응답을 돌려주는 가짜 Gemini (부하 테스트/오프라인 실행용).
+    latency(+0~jitter)초 지연 후 응답하며, rate_429 비율로 429 오류를 낸다.
+    slow_rate 비율의 요청은 slow_latency초 동안 멈춘다 (응답 시간 꼬리 재현).
+    같은 이미지는 항상 같은 응답을 받는다.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_429=0.0, seed=None, slow_rate=0.0, slow_latency=60.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.model_name = "fake"
+        self.requests = 0  # 받은 요청 수 (배치 모드 효과 확인용)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, image_bytes, mime_type, safety_settings=None):
+        self._respond()
+        rng = random.Random(hashlib.sha256(image_bytes).digest())
+        if "top_data" in prompt:
+            return json.dumps(_fake_ocr_sheet(rng), ensure_ascii=False)
+        return json.dumps(_fake_battle_sheet(rng), ensure_ascii=False)
+
+    def generate_parts(self, parts, safety_settings=None):
+        """배치 요청: 이미지마다 배틀 시세표를 만들어 {"sheets": [...]}로 응답 (요청 1건 지연)"""
+        images = [part for part in parts if not isinstance(part, str)]
+        if len(images) == 1:
+            prompt = "\n".join(part for part in parts if isinstance(part, str))
+            return self.generate(prompt, images[0][0], images[0][1], safety_settings)
+        self._respond()
+        sheets = [
+            {"image": n, **_fake_battle_sheet(random.Random(hashlib.sha256(data).digest()))}
+            for n, (data, _) in enumerate(images, start=1)
+        ]
+        return json.dumps({"sheets": sheets}, ensure_ascii=False)
+
+    def _respond(self):
+        """지연 후 일정 비율로 429 오류"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            if self._rng.random() < self.slow_rate:
+                delay = self.slow_latency
+            throttled = self._rng.random() < self.rate_429
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            raise RuntimeError("429 Resource has been exhausted (fake)")
+
+
+def get_extractor(api_key, model_name, mode=None):
+    """환경변수(SUNGZIDANG_EXTRACTOR)에 따라 백엔드 선택"""
+    mode = mode or os.environ.get("SUNGZIDANG_EXTRACTOR", "live")
+    recordings_dir = os.environ.get("SUNGZIDANG_RECORDINGS", DEFAULT_RECORDINGS_DIR)
+
+    if mode == "live":
+        return GeminiExtractor(api_key, model_name)
+    if mode == "record":
+        return RecordingExtractor(GeminiExtractor(api_key, model_name), recordings_dir)
+    if mode == "replay":
+        latency = os.environ.get("SUNGZIDANG_REPLAY_LATENCY", "0")
+        return ReplayExtractor(recordings_dir, latency if latency == "recorded" else float(latency))
+    if mode == "fake":
+        return FakeExtractor(
+            float(os.environ.get("SUNGZIDANG_FAKE_LATENCY", "0")),
+            rate_429=float(os.environ.get("SUNGZIDANG_FAKE_429", "0")),
+        )
+    raise ValueError(f"알 수 없는 추출 백엔드입니다: {mode}")
@@ -0,0 +1,287 @@
+import json
+import re
+import time
+
+import pandas as pd
+
+from extractors import get_extractor
+from page_inputs import sheet_token_estimator
+from reference_data import VALID_MODEL_NAMES, VALID_PLAN_NAMES, map_model_code_to_name
+
+# Safety Settings: 모든 필터 해제 (시세표가 스팸/상업적으로 분류될 수 있음)
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+
+# --- 1. Gemini 파싱 함수 (배틀용) ---
+def _battle_prompt():
+    """배틀 분석 지시문 (시세표 1장 기준)"""
+    # Reference data 로드
+    model_list_str = ", ".join(VALID_MODEL_NAMES) if VALID_MODEL_NAMES else "None"
+    plan_list_str = ", ".join(VALID_PLAN_NAMES) if VALID_PLAN_NAMES else "None"
+    
+    prompt = f"""
+    Analyze this mobile phone price sheet image FULLY from TOP to BOTTOM.
+    There are often MULTIPLE tables (e.g., Premium models at top, Low-cost models at bottom).
+    
+    **CRITICAL Instructions:**
+    1. **Scan the ENTIRE image**: Look for all tables (Main, Low Cost, etc.).
+    
+    2. **Header Analysis (Sub-Agency & Condition)**:
+       - **Sub-Agency Detection**:
+         - Look for codes like "I", "J", "K", "Eren", "Hong", etc. attached to headers (e.g., "SK-I", "KT-J").
+         - If found, extract "I", "J", "Eren" as the **Sub-Agency**.
+         - If NOT found (e.g., just "MNP"), use "Common" or "Main".
+         
+       - **Condition Detection (CRITICAL)**:
+         - You MUST combine **Contract Type** + **Join Type**.
+         - **Contract Type**: Look for "공시", "공시지원금" -> **"공시"**. Look for "선약", "선택약정" -> **"선약"**. (If neither found, infer from context or default to "공시").
+         - **Join Type**: Look for "MNP", "번이" -> **"MNP"**. Look for "기변", "기기변경" -> **"기변"**.
+         - **Output Example**: "공시 MNP", "선약 기변", "공시 신규"
+         
+       - **Plan Detection (CRITICAL)**:
+         - Detect plan name accurately. Map to: {plan_list_str}
+         - **Inference from Price**: If header has "109", "109000" -> **"5GX 프리미엄"**. If "89", "89000" -> **"5GX 프라임"**.
+         - **IMPORTANT**: For "T우주", use the full name **"5GX 프리미엄(T우주)"**.
+         - If no plan, use "Standard".
+
+    3. **Footer & Conditions**:
+       - Extract **ALL** text at the bottom of the image (subscription conditions, notices, additional fees, etc.).
+       - Do NOT summarize. Capture the full text as a single string.
+
+    4. **Output Format (JSON Structure)**:
+       - Return a SINGLE JSON object.
+       - **"columns"**: A list of objects describing each column (excluding Model column).
+         - Example: `[{{"sub_agency": "I", "condition": "MNP", "plan": "5GX Prime"}}, {{"sub_agency": "J", "condition": "기변", "plan": "Save Plan"}}]`
+       - **"rows"**: List of rows. Each row starts with Model Name, followed by prices corresponding to "columns".
+       - **"footer"**: The extracted footer text.
+       
+    **Example Output:**
+    {{
+      "columns": [
+        {{"sub_agency": "I", "condition": "MNP", "plan": "5GX Prime"}},
+        {{"sub_agency": "I", "condition": "기변", "plan": "5GX Prime"}},
+        {{"sub_agency": "J", "condition": "MNP", "plan": "Save Plan"}}
+      ],
+      "rows": [
+        ["SM-S921N", 10, 20, null],
+        ["SM-A245N", null, null, 0]
+      ],
+      "footer": "..."
+    }}
+    """
+    return prompt
+
+
+def _sheet_frame(data):
+    """Gemini 응답 JSON(시세표 1장: columns/rows/footer)을 (DataFrame, 조건문)으로 변환"""
+    # DataFrame 변환
+    raw_columns = data.get("columns", [])
+    raw_rows = data.get("rows", [])
+    
+    # 1. 컬럼 이름 생성 (중복 허용, 나중에 병합됨)
+    column_names = []
+    for col in raw_columns:
+        sub = col.get("sub_agency", "공통")
+        cond = col.get("condition", "조건")
+        plan = col.get("plan", "표준")
+        
+        # [Hardcoded Fix] T우주 -> 5GX 프리미엄(T우주)
+        if "T우주" in plan:
+            plan = "5GX 프리미엄(T우주)"
+            
+        column_names.append(f"{sub}|{cond}({plan})")
+        
+    # 2. 행 데이터 -> 딕셔너리 리스트 변환 (중복 컬럼 병합)
+    data_dicts = []
+    for r in raw_rows:
+        if not r: continue
+        
+        # 행 데이터 Sanitization
+        sanitized_r = []
+        for cell in r:
+            if isinstance(cell, (dict, list)):
+                sanitized_r.append(str(cell))
+            else:
+                sanitized_r.append(cell)
+        
+        # 첫 번째 값은 모델명
+        model_name = str(sanitized_r[0]) if len(sanitized_r) > 0 and sanitized_r[0] is not None else "Unknown"
+        row_dict = {"Model": model_name}
+        
+        # 나머지 값들은 가격
+        values = sanitized_r[1:]
+        for i, val in enumerate(values):
+            if i < len(column_names):
+                col_name = column_names[i]
+                # 값이 유효한 경우에만 저장 (None, 빈 문자열 제외)
+                if val is not None and val != "":
+                    # 이미 값이 있으면? (중복 컬럼) -> 덮어쓰기
+                    # (보통 Sparse해서 겹치지 않거나, 뒤에 나오는 값이 최신/유효값일 확률 높음)
+                    row_dict[col_name] = val
+                    
+        data_dicts.append(row_dict)
+        
+    # 3. DataFrame 생성
+    if data_dicts:
+        df = pd.DataFrame(data_dicts)
+        # Model 컬럼이 맨 앞에 오도록 보장 (딕셔너리 순서가 보장되지만 명시적으로)
+        cols = ["Model"] + [c for c in df.columns if c != "Model"]
+        df = df[cols]
+    else:
+        df = pd.DataFrame(columns=["Model", "Price"])
+        
+    # Footer Sanitization
+    footer = data.get("footer", "")
+    if isinstance(footer, (dict, list)):
+        footer = str(footer)
+    
+    # 모델 코드를 표준 모델명으로 매핑 (reference_data.map_model_code_to_name)
+    # 첫 번째 컬럼(모델명)을 표준 이름으로 변환
+    if not df.empty:
+        first_col = df.columns[0]
+        # 첫 번째 컬럼의 값들도 문자열로 변환 (안전장치)
+        df[first_col] = df[first_col].astype(str).apply(map_model_code_to_name)
+        
+        # 인덱스 설정 (첫 열 기준)
+        # 주의: 중복된 모델명이 있을 수 있음 (다른 섹션). 따라서 인덱스로 설정하되 중복 허용
+        df.set_index(first_col, inplace=True)
+        
+        # 전체 숫자 변환 시도
+        df = df.apply(pd.to_numeric, errors='coerce')
+    
+    # 분석 결과만 반환 (PolicyData 객체 생성은 호출 측에서)
+    return df, footer
+
+
+def parse_image_with_gemini_v2(file_bytes, agency_name, color_hex, api_key, model_name, extractor=None, mime_type="image/jpeg"):
+    """V2 전용: 배틀 모드에서 사용하는 Gemini 파싱 함수 (extractor 미지정 시 환경변수 기준 백엔드, 페이지 1장 기준)"""
+    if extractor is None:
+        extractor = get_extractor(api_key, model_name)
+    
+    prompt = _battle_prompt()
+    
+    text = extractor.generate(prompt, file_bytes, mime_type, safety_settings=SAFETY_SETTINGS)
+    print(f"DEBUG: Gemini Response Text: '{text}'") # 디버깅용 출력
+    
+    return _sheet_frame(_response_json(text))
+
+
+def _response_json(text):
+    """응답 텍스트에서 JSON 객체 추출 (설명 텍스트 제거). 실패 시 ValueError"""
+    try:
+        # 정규표현식으로 JSON 객체 추출 (설명 텍스트 제거)
+        match = re.search(r'\{.*\}', text, re.DOTALL)
+        if match:
+            json_str = match.group(0)
+            return json.loads(json_str)
+        else:
+            # JSON 패턴을 못 찾은 경우
+            raise ValueError("No JSON object found in response")
+            
+    except (json.JSONDecodeError, ValueError) as e:
+        raise ValueError(f"Gemini 응답 오류: JSON 파싱 실패. 오류: {e}\n응답 내용: {text[:500]}...") from e
+
+
+# --- 1-1. 작은 시세표 여러 장을 한 요청으로 분석 (배치 모드) ---
+# 지시문은 한 번만 보내고 이미지마다 "IMAGE n" 라벨을 붙여 generate_content 1회로 분석한다.
+# 응답 {"sheets": [{"image": n, "columns", "rows", "footer"}, ...]}을 이미지별 (df, 조건문)으로 나눈다.
+BATCH_PROMPT_SUFFIX = """
+    **BATCH MODE:**
+    - You are given {count} price sheet images. Each image is preceded by a label "IMAGE 1" ... "IMAGE {count}".
+    - Apply ALL instructions above to EACH image separately. Never mix rows, columns or footer text between images.
+    - Return a SINGLE JSON object: {{"sheets": [{{"image": 1, "columns": [...], "rows": [...], "footer": "..."}}, ...]}}
+    - Include exactly one entry per image, in label order, with "image" set to its label number.
+    """
+
+
+def parse_images_batch_with_gemini(pages, api_key, model_name, extractor=None, estimator=None):
+    """
+    작은 시세표 여러 장 [(bytes, mime_type), ...]을 요청 1건으로 분석해 페이지 순서대로 (df, 조건문) 목록 반환.
+    응답에 없거나 읽지 못한 페이지는 None (호출 측에서 단독 분석).
+    응답이 출력 토큰 한도에 걸려 잘리면 추정값을 올리고 묶음을 반으로 나눠 다시 요청한다.
+    """
+    if len(pages) < 2:
+        return [None] * len(pages)
+    if extractor is None:
+        extractor = get_extractor(api_key, model_name)
+    estimator = estimator or sheet_token_estimator
+
+    parts = [_battle_prompt() + BATCH_PROMPT_SUFFIX.format(count=len(pages))]
+    for n, (data, mime_type) in enumerate(pages, start=1):
+        parts.extend([f"IMAGE {n}", (data, mime_type)])
+    text = extractor.generate_parts(parts, safety_settings=SAFETY_SETTINGS)
+
+    try:
+        data = _response_json(text)
+    except ValueError:
+        estimator.truncated(len(pages))
+        half = len(pages) // 2
+        return (parse_images_batch_with_gemini(pages[:half], api_key, model_name, extractor, estimator)
+                + parse_images_batch_with_gemini(pages[half:], api_key, model_name, extractor, estimator))
+    estimator.observe(text, len(pages))
+
+    results = [None] * len(pages)
+    for sheet in data.get("sheets") or []:
+        n = sheet.get("image") if isinstance(sheet, dict) else None
+        if isinstance(n, int) and 1 <= n <= len(pages) and results[n - 1] is None:
+            try:
+                results[n - 1] = _sheet_frame(sheet)
+            except Exception:
+                continue
+    return results
+
+
+
+# --- 2. Gemini 추출 함수 (Tab 1: 시세표 to 엑셀) ---
+SIMPLE_OCR_PROMPT = """
+Analyze the provided price sheet image and extract data into a specific JSON structure.
+
+**CRITICAL INSTRUCTION: Extract text EXACTLY as shown in the image (Korean). DO NOT TRANSLATE to English.**
+
+The JSON must have these keys: "top_data", "bottom_data", "footer_lines".
+
+1. "top_data": A list of lists representing the main price table.
+   - Columns should correspond to: [Model, FactoryPrice, PublicSupport, SK_Move, SK_Change, SK_Card_Move, SK_Card_Change, KT_Move, KT_Change, KT_Card_Move, KT_Card_Change, LG_Move, LG_Change, LG_Card_Move, LG_Card_Change]
+   - Extract numerical values for prices. If a cell is empty or has '-', use null or 0.
+   - Example row: ["Flip7 256", 148.5, 60, 13, 18, -27, -22, 15, 15, -25, -25, -3, -1, -43, -41]
+
+2. "bottom_data": A list of lists for the carrier condition table at the bottom.
+   - Columns: [Carrier, ServiceCondition, MonthlyFee, Duration, Penalty]
+   - **KEEP KOREAN TEXT**: e.g., ["SK(24개월)", "요금제: 프라임", "109,000원", "6개월", "500,000원"]
+
+3. "footer_lines": A list of strings for the caution/notice text at the very bottom.
+   - Capture each distinct line of text as a string in the list.
+   - **KEEP KOREAN TEXT**. Do not summarize or translate.
+
+Output ONLY valid JSON.
+"""
+
+
+def extract_price_sheet(file_bytes, mime_type, api_key, model_name, report=None, max_retries=3, retry_delay=5, extractor=None):
+    """Tab 1 전용: 시세표 이미지를 top_data/bottom_data/footer_lines JSON으로 추출"""
+    # 사용자가 선택한 모델 사용
+    if extractor is None:
+        extractor = get_extractor(api_key, model_name)
+
+    # 재시도 로직 (429 Rate Limit 대응)
+    for attempt in range(max_retries):
+        try:
+            text = extractor.generate(SIMPLE_OCR_PROMPT, file_bytes, mime_type)
+
+            # JSON 파싱
+            json_str = text.replace("```json", "").replace("```", "").strip()
+            return json.loads(json_str)
+        except Exception as e:
+            error_msg = str(e)
+            if "429" in error_msg and attempt < max_retries - 1:
+                if report:
+                    report(f"⚠️ 사용량 초과(429). {retry_delay}초 후 재시도합니다... ({attempt+1}/{max_retries})")
+                time.sleep(retry_delay)
+                retry_delay *= 2 # 대기 시간 2배로 늘림
+            else:
+                raise
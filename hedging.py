@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+
+# --- 지연 시간 기반 Gemini 호출 (마감 시간 / 헤지 요청 / 보조 모델) ---
+# 대부분 10초 안에 끝나지만 가끔 1분 이상 멈추는 호출 때문에 배틀 전체가 기다리지 않도록 한다.
+#   1. 첫 요청(primary)을 보내고, 모델별 최근 응답 시간 p95가 지나도록 답이 없으면 두 번째 요청(헤지)을 보낸다.
+#      보조 모델이 있으면 보조 모델로(fallback), 없으면 같은 모델로 다시(hedge) 보낸다.
+#      첫 요청이 오류로 끝나면 p95를 기다리지 않고 바로 두 번째 요청을 보낸다.
+#   2. 먼저 도착한 정상 결과(예외 없이 파싱까지 끝난 결과)를 사용하고 어느 경로가 이겼는지 기록한다.
+#   3. 마감 시간(deadline)까지 정상 결과가 없으면 TimeoutError. 마감 초과는 응답 시간 기록에 넣지 않는다
+#      (끝난 요청만 기록 - 마감 시간을 기록하면 p95가 마감 시간이 되어 헤지가 꺼짐).
+# 멈춘 요청은 취소할 수 없으므로 데몬 스레드에서 실행하고 결과만 버린다.
+
+PRIMARY = "primary"
+HEDGE = "hedge"
+FALLBACK = "fallback"
+
+DEFAULT_DEADLINE = 90  # 호출 1건 마감 시간(초)
+DEFAULT_HEDGE_AFTER = 20  # 응답 시간 기록이 부족할 때 헤지 기준(초)
+MIN_HEDGE_AFTER = 5
+MAX_HEDGE_RATIO = 1 / 3  # 헤지 기준은 마감 시간의 1/3을 넘지 않음 (느린 응답이 쌓여도 헤지할 시간을 남김)
+MIN_SAMPLES = 10  # p95를 믿기 위한 최소 기록 수
+LATENCY_WINDOW = 200  # 모델별로 보관하는 최근 응답 시간 수
+
+
+class LatencyTracker:
+    """모델별 최근 응답 시간 (성공한 호출만)"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key, q=0.95):
+        """기록이 MIN_SAMPLES개 미만이면 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+# 프로세스 전체에서 공유 (작업 워커 스레드들이 함께 기록)
+latency_tracker = LatencyTracker()
+
+
+class HedgedCaller:
+    """
+    마감 시간/헤지 요청/보조 모델을 적용해 함수를 호출.
+    wins: 경로별로 이긴 횟수 (primary/hedge/fallback), timeouts: 마감 시간 초과 횟수
+    """
+
+    def __init__(self, deadline=DEFAULT_DEADLINE, hedge_after=None, tracker=None):
+        self.deadline = deadline
+        self.hedge_after = hedge_after  # 고정값(초). None이면 모델별 p95
+        self.tracker = tracker or latency_tracker
+        self.wins = Counter()
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self, key):
+        """key(모델명)의 헤지 기준 시간(초)"""
+        if self.hedge_after is not None:
+            return self.hedge_after
+        cap = self.deadline * MAX_HEDGE_RATIO
+        p95 = self.tracker.percentile(key)
+        if p95 is None:
+            return min(DEFAULT_HEDGE_AFTER, cap)
+        return min(max(p95, MIN_HEDGE_AFTER), cap)
+
+    def _launch(self, results, path, key, fn):
+        def run():
+            started = time.monotonic()
+            try:
+                value = fn()
+            except Exception as e:
+                results.put((path, None, e))
+                return
+            self.tracker.record(key, time.monotonic() - started)
+            results.put((path, value, None))
+
+        threading.Thread(target=run, name=f"gemini-{path}", daemon=True).start()
+
+    def call(self, key, fn, fallback_key=None, fallback_fn=None, hedge=True):
+        """
+        fn()을 호출해 (결과, 이긴 경로) 반환. key/fallback_key는 응답 시간 기록용 모델명.
+        hedge=False면 마감 시간만 적용한다. 두 요청 모두 실패하면 첫 오류를 다시 던진다.
+        """
+        results = queue.Queue()
+        started = time.monotonic()
+        deadline_at = started + self.deadline
+        hedge_at = started + self.hedge_delay(key)
+        self._launch(results, PRIMARY, key, fn)
+        running, hedged, errors = 1, not hedge, []
+
+        while True:
+            now = time.monotonic()
+            wait_until = deadline_at if hedged else min(hedge_at, deadline_at)
+            try:
+                path, value, error = results.get(timeout=max(0.0, wait_until - now))
+            except queue.Empty:
+                if time.monotonic() >= deadline_at:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise TimeoutError(f"Gemini 응답 시간 초과 ({self.deadline}초)") from None
+                path, value, error = None, None, None
+
+            if path is not None:
+                running -= 1
+                if error is None:
+                    with self._lock:
+                        self.wins[path] += 1
+                    return value, path
+                errors.append(error)
+
+            if not hedged:
+                # p95를 넘겼거나 첫 요청이 실패함 → 두 번째 요청
+                hedged = True
+                running += 1
+                if fallback_fn is not None:
+                    self._launch(results, FALLBACK, fallback_key or key, fallback_fn)
+                else:
+                    self._launch(results, HEDGE, key, fn)
+            elif running == 0:
+                raise errors[0]
@@ -0,0 +1,237 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from profiling import Profile, profiling_enabled
+
+# --- 로컬 작업 큐 (OCR/엑셀/Supabase 작업을 Streamlit 스크립트 밖에서 실행) ---
+# 작업 상태는 SQLite에 저장되므로 재실행(rerun)이나 프로세스 재시작 후에도 이어진다.
+# 한 DB 파일은 하나의 Streamlit 프로세스가 사용한다고 가정한다.
+# payload에 "profile": True가 있으면 (또는 SUNGZIDANG_PROFILE=1) 핸들러 실행을 측정해 <종류>-<job_id>로 저장한다.
+
+DEFAULT_DB_PATH = os.path.join(".cache", "jobs.sqlite3")
+DEFAULT_RETENTION = 24 * 3600  # 끝난 작업(페이지 이미지/엑셀 포함)을 보관하는 시간(초)
+PURGE_INTERVAL = 3600  # 실행 중 오래된 작업 정리 주기(초)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobError(Exception):
+    """사용자에게 그대로 보여줄 작업 실패 (hint: 해결 방법 안내)"""
+
+    def __init__(self, message, hint=None):
+        super().__init__(message)
+        self.hint = hint
+
+
+class JobContext:
+    """핸들러에 전달되는 실행 정보"""
+
+    def __init__(self, service, job_id, secrets):
+        self.service = service
+        self.job_id = job_id
+        self.secrets = secrets or {}
+
+    def report(self, message):
+        """진행 상황 메시지 기록 (UI에서 폴링해 표시)"""
+        self.service._append_log(self.job_id, message)
+
+
+class JobService:
+    """
+    submit/poll/result API를 가진 로컬 작업 서비스.
+    핸들러는 handler(payload, ctx) 형태이며 반환값이 결과로 저장된다.
+    API 키 같은 비밀값은 DB에 저장하지 않고 메모리에만 둔다.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_workers=4, default_secrets=None, retention=DEFAULT_RETENTION):
+        self.db_path = db_path
+        self.default_secrets = default_secrets  # 재시작으로 비밀값이 사라진 작업용 (callable)
+        self.retention = retention  # None이면 정리하지 않음
+        self._last_purge = 0.0
+        self._handlers = {}
+        self._secrets = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                create table if not exists jobs (
+                    id text primary key,
+                    kind text not null,
+                    status text not null,
+                    payload blob,
+                    result blob,
+                    error text,
+                    hint text,
+                    log text not null default '[]',
+                    created_at real not null,
+                    updated_at real not null
+                )
+                """
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def start(self):
+        """보관 기간이 지난 작업을 정리하고, 이전 프로세스에서 끝나지 못한 작업을 다시 큐에 넣음"""
+        self._purge_expired(force=True)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "update jobs set status = ?, updated_at = ? where status = ?",
+                (QUEUED, time.time(), RUNNING),
+            )
+            rows = conn.execute(
+                "select id, kind from jobs where status = ? order by created_at", (QUEUED,)
+            ).fetchall()
+        for row in rows:
+            if row["kind"] in self._handlers:
+                self._executor.submit(self._run, row["id"])
+
+    def submit(self, kind, payload, secrets=None):
+        """작업 등록 후 job_id 반환"""
+        if kind not in self._handlers:
+            raise ValueError(f"등록되지 않은 작업 종류입니다: {kind}")
+
+        # 오래 떠 있는 프로세스에서도 DB가 계속 커지지 않도록 제출 시 주기적으로 정리
+        self._purge_expired()
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "insert into jobs (id, kind, status, payload, created_at, updated_at) values (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, pickle.dumps(payload), now, now),
+            )
+        if secrets:
+            self._secrets[job_id] = secrets
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def poll(self, job_id):
+        """작업 상태 조회. 없는 작업이면 None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "select id, kind, status, error, hint, log, created_at, updated_at from jobs where id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["log"] = json.loads(job["log"])
+        return job
+
+    def payload(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("select payload from jobs where id = ?", (job_id,)).fetchone()
+        return pickle.loads(row["payload"]) if row and row["payload"] is not None else None
+
+    def result(self, job_id):
+        """완료된 작업의 결과. 실패한 작업이면 JobError"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "select status, result, error, hint from jobs where id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(job_id)
+        if row["status"] == FAILED:
+            raise JobError(row["error"], row["hint"])
+        if row["status"] != DONE:
+            return None
+        return pickle.loads(row["result"]) if row["result"] is not None else None
+
+    def purge(self, older_than=24 * 3600):
+        """오래된 완료/실패 작업 삭제"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "delete from jobs where status in (?, ?) and updated_at < ?",
+                (DONE, FAILED, time.time() - older_than),
+            )
+
+    def _purge_expired(self, force=False):
+        if self.retention is None:
+            return
+        now = time.time()
+        if not force and now - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        self.purge(self.retention)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _append_log(self, job_id, message):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("select log from jobs where id = ?", (job_id,)).fetchone()
+            log = json.loads(row["log"]) if row else []
+            log.append(message)
+            conn.execute(
+                "update jobs set log = ?, updated_at = ? where id = ?",
+                (json.dumps(log, ensure_ascii=False), time.time(), job_id),
+            )
+
+    def _finish(self, job_id, status, result=None, error=None, hint=None):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "update jobs set status = ?, result = ?, error = ?, hint = ?, updated_at = ? where id = ?",
+                (status, result, error, hint, time.time(), job_id),
+            )
+        self._secrets.pop(job_id, None)
+
+    def _run_profiled(self, handler, payload, ctx, kind):
+        profile = Profile(f"{kind}-{ctx.job_id}", f"{kind} 작업 {ctx.job_id}")
+        profile.start()
+        try:
+            return handler(payload, ctx)
+        finally:
+            # 실패한 작업도 측정 결과는 남김
+            summary_path = profile.finish()
+            if summary_path:
+                ctx.report(f"🩺 성능 측정 결과 저장: {summary_path}")
+
+    def _run(self, job_id):
+        # queued -> running 전환에 성공한 워커만 실행 (중복 실행 방지)
+        with self._lock, self._connect() as conn:
+            claimed = conn.execute(
+                "update jobs set status = ?, updated_at = ? where id = ? and status = ?",
+                (RUNNING, time.time(), job_id, QUEUED),
+            ).rowcount
+            row = conn.execute("select kind, payload from jobs where id = ?", (job_id,)).fetchone()
+        if not claimed or row is None:
+            return
+
+        secrets = self._secrets.get(job_id)
+        if secrets is None and self.default_secrets:
+            secrets = self.default_secrets()
+        ctx = JobContext(self, job_id, secrets)
+
+        try:
+            handler = self._handlers[row["kind"]]
+            payload = pickle.loads(row["payload"])
+            if profiling_enabled() or (isinstance(payload, dict) and payload.get("profile")):
+                result = self._run_profiled(handler, payload, ctx, row["kind"])
+            else:
+                result = handler(payload, ctx)
+        except JobError as e:
+            self._finish(job_id, FAILED, error=str(e), hint=e.hint)
+        except Exception as e:
+            self._finish(job_id, FAILED, error=f"{type(e).__name__}: {e}")
+        else:
+            self._finish(job_id, DONE, result=pickle.dumps(result))
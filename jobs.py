@@ -0,0 +1,388 @@
+import importlib
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from artifact_cache import excel_key, battle_key
+from hedging import FALLBACK, HEDGE, HedgedCaller
+from job_service import JobError
+from object_store import put_content, put_object
+from page_inputs import MAX_PAGE_WORKERS, map_pages, merge_page_frames, merge_page_json, page_extension, plan_batches
+from parse_store import pages_key, parsed_payload, frame_from_parsed
+from single_flight import SHARED, bytes_key, gemini_flight
+
+# --- 작업 핸들러 (Tab 1 변환 / Tab 2 분석·엑셀 생성) ---
+# Streamlit에 의존하지 않으며, Gemini/Supabase 함수는 주입받아 로컬 대역으로 교체할 수 있다.
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _require(secrets, *keys):
+    missing = [k for k in keys if not secrets.get(k)]
+    if missing:
+        raise JobError(
+            "서버 설정(API Key)이 없어 작업을 진행할 수 없습니다.",
+            "왼쪽 사이드바에서 서버 설정을 완료한 뒤 다시 시도해주세요.",
+        )
+
+
+def _upload_error(bucket, e, what="이미지 업로드"):
+    """Storage 업로드 오류를 사용자 안내 메시지로 변환"""
+    error_msg = str(e)
+    if "Bucket not found" in error_msg or "404" in error_msg:
+        return JobError(
+            f"❌ **오류: '{bucket}' 버킷을 찾을 수 없습니다.**",
+            f"Supabase 대시보드 > Storage 메뉴로 이동해서 **'{bucket}'** 라는 이름의 **Public Bucket**을 새로 만들어주세요.",
+        )
+    if "row-level security policy" in error_msg or "403" in error_msg:
+        return JobError(
+            "❌ **오류: 권한이 없습니다 (RLS Policy).**",
+            f"Supabase Storage의 '{bucket}' 버킷에 대해 Public Access 정책을 설정해주세요.",
+        )
+    return JobError(f"{what} 실패: {e}")
+
+
+def _payload_pages(payload):
+    """작업 payload의 페이지 목록 (이전 형식의 단일 파일 payload도 지원)"""
+    return payload.get("pages") or [(payload["file_bytes"], payload["mime_type"])]
+
+
+def _gemini_call(hedger, payload, ctx, routes, label, call, flight=None, flight_key=None):
+    """
+    call(모델명)을 마감 시간/헤지 요청/보조 모델(payload["fallback_model"])을 적용해 실행.
+    이긴 경로를 routes에 (label, 경로)로 기록한다. hedger가 없으면 그대로 호출
+    flight가 있으면 같은 flight_key로 진행 중인 호출(다른 세션 포함)에 합쳐 그 결과를 함께 받는다 (경로 SHARED).
+    """
+    model_name = payload["model_name"]
+    fallback_model = payload.get("fallback_model")
+
+    def run():
+        if hedger is None:
+            return call(model_name), None
+        return hedger.call(
+            model_name, lambda: call(model_name),
+            fallback_key=fallback_model,
+            fallback_fn=(lambda: call(fallback_model)) if fallback_model else None,
+        )
+
+    if flight is None:
+        value, path = run()
+    else:
+        (value, path), shared = flight.do(flight_key, run)
+        if shared:
+            path = SHARED
+            ctx.report(f"🔗 {label}: 같은 시세표를 먼저 보낸 요청의 결과를 함께 사용합니다.")
+    if path is not None:
+        routes.append((label, path))
+    if path == FALLBACK:
+        ctx.report(f"⚡ {label}: 응답이 늦어 보조 모델({fallback_model}) 결과를 사용합니다.")
+    elif path == HEDGE:
+        ctx.report(f"⚡ {label}: 응답이 늦어 다시 보낸 요청의 결과를 사용합니다.")
+    return value
+
+
+def _flight_key(kind, payload, page_bytes, mime_type):
+    """같은 호출로 볼 기준: 호출 종류 + 페이지 내용 + 모델/보조 모델"""
+    return bytes_key(kind, page_bytes, mime_type, payload["model_name"], payload.get("fallback_model") or "")
+
+
+def run_simple_ocr(payload, ctx, create_client, extract_fn, create_excel_bytes, artifact_cache, hedger=None, flight=None):
+    """
+    Tab 1: 업로드 → Gemini 추출(페이지별 동시, 마감 시간/헤지 적용) → 엑셀 생성 → 백업 → 이력 기록
+    flight가 있으면 다른 세션이 같은 페이지를 추출 중일 때 그 호출에 합친다.
+    """
+    secrets = ctx.secrets
+    _require(secrets, "gemini_api_key", "supabase_url", "supabase_key")
+
+    try:
+        supabase = create_client(secrets["supabase_url"], secrets["supabase_key"])
+    except Exception as e:
+        raise JobError(f"Supabase 연결 오류: {e}")
+
+    # 1. Supabase Storage에 원본 이미지 업로드 (uploads 버킷)
+    ctx.report("1️⃣ 원본 이미지를 서버에 저장 중...")
+    pages = _payload_pages(payload)
+    # 내용 해시를 키로 사용 (같은 이미지는 다시 올리지 않음, 여러 장이면 첫 장 URL을 이력에 기록)
+    try:
+        page_urls = [
+            put_content(supabase.storage, "uploads", "simple-ocr", page_bytes, mime_type, page_extension(mime_type))
+            for page_bytes, mime_type in pages
+        ]
+        image_public_url = page_urls[0]
+    except Exception as e:
+        raise _upload_error("uploads", e)
+
+    # 2. Gemini 호출 (OCR) - 페이지가 여러 장이면 동시에 추출 후 합침
+    page_note = f", {len(pages)}페이지 동시 처리" if len(pages) > 1 else ""
+    ctx.report(f"2️⃣ Gemini ({payload['model_name']})가 데이터를 추출 중...{page_note}")
+    routes = []  # [(구분, 이긴 경로)]
+    try:
+        data_json = merge_page_json(map_pages(pages, lambda page_bytes, mime_type: _gemini_call(
+            hedger, payload, ctx, routes, "시세표 추출",
+            lambda model_name: extract_fn(
+                page_bytes, mime_type, secrets["gemini_api_key"], model_name, report=ctx.report
+            ),
+            flight, _flight_key("extract", payload, page_bytes, mime_type),
+        )))
+    except Exception as e:
+        raise JobError(f"Gemini 처리 실패: {e}")
+
+    # 3. 엑셀 파일 생성 (같은 결과물이면 캐시 재사용)
+    ctx.report("3️⃣ 엑셀 파일 생성 중...")
+    margin = payload["margin"]
+    artifact_key = excel_key(data_json, margin)
+    excel_bytes = artifact_cache.get(artifact_key)
+    if excel_bytes is None:
+        excel_bytes = create_excel_bytes(data_json, margin).getvalue()
+        artifact_cache.put(artifact_key, excel_bytes)
+
+    # 4. 엑셀 파일 Supabase 저장 (exports 버킷) - 이미 올린 결과물이면 생략
+    ctx.report("4️⃣ 엑셀 파일을 클라우드에 백업 중...")
+    # 다운로드 파일명은 시각 기준, 저장 키는 입력 내용 해시 기준
+    excel_name = f"simple-excel/converted_{int(time.time())}.xlsx"
+    try:
+        excel_public_url = artifact_cache.get_url(artifact_key)
+        if not excel_public_url:
+            excel_public_url = put_object(
+                supabase.storage, "exports", f"simple-excel/{artifact_key}.xlsx", excel_bytes, XLSX_MIME
+            )
+            artifact_cache.set_url(artifact_key, excel_public_url)
+    except Exception as e:
+        raise _upload_error("exports", e, what="엑셀 업로드")
+
+    # 5. DB에 기록 남기기
+    ctx.report("5️⃣ 작업 이력 기록 중...")
+    warnings = []
+    try:
+        supabase.table("price_sheets").insert({
+            "filename": payload["filename"],
+            "image_url": image_public_url,
+            "excel_url": excel_public_url,
+            "status": "success"
+        }).execute()
+    except Exception as e:
+        warnings.append(f"DB 기록 실패 (파일은 생성됨): {e}")
+
+    return {
+        "excel_bytes": excel_bytes,
+        "excel_name": excel_name,
+        "excel_url": excel_public_url,
+        "warnings": warnings,
+        "routes": routes,
+    }
+
+
+def _parse_batched(pending, parse_page, batch_parse_fn, ctx):
+    """
+    배치 모드: 분석할 모든 대리점의 페이지를 작은 것끼리 묶어 요청 1건씩으로 분석.
+    {(항목 순번, 페이지 순번): (df, 조건문) 또는 예외} 반환. 묶음 응답에서 빠진 페이지는 단독으로 다시 분석한다.
+    """
+    flat = [(i, j, page) for i, (_, pages, _) in enumerate(pending) for j, page in enumerate(pages)]
+    batches = plan_batches([len(page[0]) for _, _, page in flat])
+    ctx.report(f"📦 시세표 {len(flat)}장을 요청 {len(batches)}건으로 묶어 분석 중...")
+
+    def run(batch):
+        pages = [flat[k][2] for k in batch]
+        parsed = [None] * len(batch)
+        if len(batch) > 1:
+            try:
+                parsed = batch_parse_fn(pages)
+            except Exception:
+                pass  # 묶음 요청 실패 → 페이지별 단독 분석
+        out = {}
+        for k, result in zip(batch, parsed):
+            i, j, (page_bytes, mime_type) = flat[k]
+            if result is None:
+                try:
+                    result = parse_page(pending[i][0], page_bytes, mime_type)
+                except Exception as e:
+                    result = e
+            out[(i, j)] = result
+        return out
+
+    page_results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_PAGE_WORKERS, len(batches)))) as pool:
+        for out in pool.map(run, batches):
+            page_results.update(out)
+    return page_results
+
+
+def run_battle_analysis(payload, ctx, create_client, parse_fn, parse_store=None, batch_parse_fn=None, hedger=None,
+                        flight=None):
+    """
+    Tab 2: 아직 분석되지 않은 대리점 시세표를 순서대로 분석하고 클라우드에 기록.
+    parse_store가 있으면 같은 시세표(내용+모델)의 이전 분석 결과를 재사용하고, 새 결과를 저장한다.
+    payload["batch"]가 참이고 batch_parse_fn이 있으면 작은 시세표 여러 장을 요청 1건으로 묶어 분석한다.
+    hedger가 있으면 Gemini 호출마다 마감 시간/헤지 요청/보조 모델을 적용한다 (묶음 요청은 마감 시간만).
+    flight가 있으면 다른 세션이 같은 페이지를 분석 중일 때 새로 호출하지 않고 그 결과를 함께 받는다 (페이지 단위).
+    """
+    secrets = ctx.secrets
+    _require(secrets, "gemini_api_key")
+    supabase_url = secrets.get("supabase_url")
+    supabase_key = secrets.get("supabase_key")
+    routes = []  # [(대리점명, 이긴 경로)]
+
+    def parse_page(item, page_bytes, mime_type):
+        return _gemini_call(hedger, payload, ctx, routes, f"'{item['name']}'", lambda model_name: parse_fn(
+            page_bytes,
+            item["name"],
+            item["color_hex"],
+            secrets["gemini_api_key"],
+            model_name,
+            mime_type=mime_type
+        ), flight, _flight_key("battle", payload, page_bytes, mime_type))
+
+    def parse_batch(pages):
+        def call():
+            return batch_parse_fn(pages, secrets["gemini_api_key"], payload["model_name"])
+        if hedger is None:
+            return call()
+        return hedger.call(payload["model_name"], call, hedge=False)[0]
+
+    results = {}  # policy id -> (df, footer_text)
+    errors = {}  # policy id -> 오류 메시지
+    warnings = []
+    pending = []  # [(item, pages, content_key)] 새로 분석할 대리점
+    for item in payload["policies"]:
+        pages = item.get("pages") or [(item["image_bytes"], "image/jpeg")]
+        content_key = pages_key(pages, payload["model_name"])
+        saved = parse_store.by_content(content_key) if parse_store else None
+        if saved:
+            # 이미 분석한 시세표와 내용이 같으면 Gemini 호출/업로드 생략
+            results[item["id"]] = frame_from_parsed(saved["parsed"])
+            if saved["agency_name"] != item["name"]:
+                parse_store.save(item["name"], saved["parsed"])
+            ctx.report(f"♻️ '{item['name']}' 이전과 같은 시세표 - 저장된 분석 결과 사용")
+            continue
+        pending.append((item, pages, content_key))
+
+    batched = None
+    if payload.get("batch") and batch_parse_fn and pending:
+        batched = _parse_batched(pending, parse_page, parse_batch, ctx)
+
+    for i, (item, pages, content_key) in enumerate(pending):
+        if batched is not None:
+            page_results = [batched[(i, j)] for j in range(len(pages))]
+            failed = next((r for r in page_results if isinstance(r, Exception)), None)
+            if failed is not None:
+                trace = "".join(traceback.format_exception(failed))
+                errors[item["id"]] = f"'{item['name']}' 분석 실패: {failed}\n\n{trace}"
+                continue
+            df, footer_text = merge_page_frames(page_results)
+        else:
+            page_note = f" ({len(pages)}페이지 동시 분석)" if len(pages) > 1 else ""
+            ctx.report(f"🤖 '{item['name']}' 분석 중...{page_note}")
+            try:
+                # Gemini 분석 (페이지별로 동시에 호출한 뒤 한 표로 합침)
+                df, footer_text = merge_page_frames(map_pages(
+                    pages, lambda page_bytes, mime_type: parse_page(item, page_bytes, mime_type)
+                ))
+            except Exception as e:
+                # 실패해도 계속 진행
+                errors[item["id"]] = f"'{item['name']}' 분석 실패: {e}\n\n{traceback.format_exc()}"
+                continue
+        results[item["id"]] = (df, footer_text)
+        parsed = parsed_payload(df, footer_text)
+        if parse_store:
+            parse_store.save(item["name"], parsed, content_key)
+
+        # Supabase에 이미지 업로드 및 DB 저장
+        if supabase_url and supabase_key:
+            try:
+                supabase_v2 = create_client(supabase_url, supabase_key)
+
+                # 내용 해시 키로 페이지별 저장 (같은 시세표는 다시 올리지 않음), 첫 장 URL을 기록
+                page_urls = [
+                    put_content(
+                        supabase_v2.storage, "uploads", "policy-battle",
+                        page_bytes, mime_type, page_extension(mime_type)
+                    )
+                    for page_bytes, mime_type in pages
+                ]
+                image_url = page_urls[0]
+
+                # DB에 로그 저장 (조건문도 함께 저장해 다음 배틀에서 불러올 수 있게)
+                supabase_v2.table("policy_uploads").insert({
+                    "agency_name": item["name"],
+                    "image_url": image_url,
+                    "parsed_data": parsed
+                }).execute()
+            except Exception as e:
+                warnings.append(f"'{item['name']}' 클라우드 저장 실패: {e}")
+
+        ctx.report(f"✅ {item['name']} 분석 완료!")
+
+    return {"results": results, "errors": errors, "warnings": warnings, "routes": routes}
+
+
+def run_battle_export(payload, ctx, create_client, create_battle_excel, artifact_cache):
+    """Tab 2: 최고의 정책서 엑셀 생성 및 클라우드 백업"""
+    secrets = ctx.secrets
+    policies = payload["policies"]
+    top_k = payload.get("top_k")
+
+    # 엑셀 생성 (필터/데이터/옵션이 같으면 캐시된 결과물 재사용)
+    ctx.report("📊 최종 엑셀 파일을 생성하고 있습니다...")
+    artifact_key = battle_key(policies, {"top_k": top_k})
+    excel_bytes = artifact_cache.get(artifact_key)
+    if excel_bytes is None:
+        excel_bytes = create_battle_excel(policies, top_k=top_k).getvalue()
+        artifact_cache.put(artifact_key, excel_bytes)
+
+    # Supabase 업로드 로직 (이미 올린 결과물이면 업로드 생략)
+    warnings = []
+    excel_url = None
+    if secrets.get("supabase_url") and secrets.get("supabase_key"):
+        ctx.report("☁️ 클라우드에 저장 중...")
+        try:
+            supabase_v2 = create_client(secrets["supabase_url"], secrets["supabase_key"])
+            excel_url = artifact_cache.get_url(artifact_key)
+            if not excel_url:
+                excel_url = put_object(
+                    supabase_v2.storage, "exports", f"battle-results/{artifact_key}.xlsx", excel_bytes, XLSX_MIME
+                )
+                artifact_cache.set_url(artifact_key, excel_url)
+
+            participants = [p.name for p in policies]
+            supabase_v2.table("battle_results").insert({
+                "excel_url": excel_url,
+                "participants": participants
+            }).execute()
+        except Exception as e:
+            warnings.append(f"클라우드 백업 실패: {e}")
+
+    return {"excel_bytes": excel_bytes, "excel_url": excel_url, "warnings": warnings}
+
+
+def _lazy(module_name, attr):
+    """호출 시점에 모듈을 불러오는 함수 (supabase/openpyxl/pandas 로드를 첫 작업까지 미룸)"""
+    def call(*args, **kwargs):
+        module = importlib.import_module(module_name)
+        return getattr(module, attr)(*args, **kwargs)
+    return call
+
+
+def register_handlers(service, artifact_cache, create_client=None, extract_fn=None, parse_fn=None, parse_store=None,
+                      batch_parse_fn=None, hedger=None, flight=None):
+    """
+    작업 핸들러 등록. create_client/extract_fn/parse_fn/batch_parse_fn을 넘기면 해당 대역을 사용
+    (미지정 시 실제 Supabase/Gemini를 첫 작업 실행 시점에 로드)
+    parse_store: 배틀 분석 결과 저장소 (같은 시세표 재분석 생략)
+    hedger: Gemini 호출 마감 시간/헤지 설정 (미지정 시 기본값의 HedgedCaller)
+    flight: 같은 페이지 동시 호출 합치기 (미지정 시 프로세스 전체 공유 gemini_flight)
+    """
+    hedger = hedger or HedgedCaller()
+    flight = flight or gemini_flight
+    create_client = create_client or _lazy("supabase", "create_client")
+    extract_fn = extract_fn or _lazy("gemini_parser", "extract_price_sheet")
+    parse_fn = parse_fn or _lazy("gemini_parser", "parse_image_with_gemini_v2")
+    batch_parse_fn = batch_parse_fn or _lazy("gemini_parser", "parse_images_batch_with_gemini")
+    create_battle_excel = _lazy("excel_builders", "create_battle_excel")
+    create_excel_bytes = _lazy("excel_builders", "create_excel_bytes")
+
+    service.register("simple_ocr", lambda payload, ctx: run_simple_ocr(
+        payload, ctx, create_client, extract_fn, create_excel_bytes, artifact_cache, hedger, flight))
+    service.register("battle_analysis", lambda payload, ctx: run_battle_analysis(
+        payload, ctx, create_client, parse_fn, parse_store, batch_parse_fn, hedger, flight))
+    service.register("battle_export", lambda payload, ctx: run_battle_export(
+        payload, ctx, create_client, create_battle_excel, artifact_cache))
@@ -0,0 +1,316 @@
+import argparse
+import copy
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from functools import partial
+
+# 동시 접속 부하 테스트: 영업사원 N명이 동시에 Tab 1 변환 / Tab 2 배틀 전체 흐름을 실행
+# Gemini는 FakeExtractor(지연/429 주입), Supabase는 로컬 폴더/메모리 대역을 사용 (네트워크 호출 없음)
+# 시나리오마다 새 프로세스에서 실행해 최대 메모리를 따로 측정한다.
+# 사용법: python load_test.py --sessions 10 --iterations 3 --latency 2 --rate-429 0.05
+# --shared-sheets: 모든 세션이 같은 회차에 같은 시세표를 올림 (아침 시간대처럼 같은 대리점 시세표가 몰리는 경우)
+
+SCENARIOS = ["ocr", "battle"]
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_SECRETS = {"gemini_api_key": "fake", "supabase_url": "fake", "supabase_key": "fake"}
+
+
+class _FakeQuery:
+    """supabase table 쿼리 대역 (insert/select/eq/order/limit/execute)"""
+
+    def __init__(self, db, table, rows=None):
+        self.db = db
+        self.table = table
+        self.rows = rows
+
+    def insert(self, row):
+        with self.db.lock:
+            self.db.tables.setdefault(self.table, []).append(row)
+        return self
+
+    def select(self, *columns):
+        with self.db.lock:
+            return _FakeQuery(self.db, self.table, list(self.db.tables.get(self.table, [])))
+
+    def eq(self, column, value):
+        return _FakeQuery(self.db, self.table, [r for r in self.rows if r.get(column) == value])
+
+    def order(self, column, desc=False):
+        # 삽입 순서를 시간 순서로 간주
+        return _FakeQuery(self.db, self.table, list(reversed(self.rows)) if desc else self.rows)
+
+    def limit(self, count):
+        return _FakeQuery(self.db, self.table, self.rows[:count])
+
+    def execute(self):
+        self.data = self.rows
+        return self
+
+
+class FakeSupabase:
+    """supabase 클라이언트 대역: storage는 로컬 폴더, table은 메모리 (latency초 지연)"""
+
+    def __init__(self, root, latency=0.0):
+        from object_store import LocalStorage
+
+        self.storage = LocalStorage(root)
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.latency = latency
+
+    def table(self, name):
+        if self.latency:
+            time.sleep(self.latency)
+        return _FakeQuery(self, name)
+
+
+def _wait(service, job_id, poll_interval):
+    """UI처럼 주기적으로 폴링하며 작업 종료 대기. 최종 상태 반환"""
+    from job_service import DONE, FAILED
+
+    while True:
+        job = service.poll(job_id)
+        if job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(poll_interval)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def _sheet_bytes(args, iteration, index):
+    """시세표 이미지 대역 (--shared-sheets면 회차/순번이 같을 때 모든 세션이 같은 내용)"""
+    if args.shared_sheets:
+        return random.Random(f"{args.seed}-{iteration}-{index}").randbytes(4096)
+    return os.urandom(4096)
+
+
+def _ocr_flow(service, session, iteration, args, stages):
+    """Tab 1: 이미지 1장 업로드 → 변환 작업 완료까지"""
+    job_id = service.submit("simple_ocr", {
+        "filename": f"sheet_{session}_{iteration}.png",
+        "pages": [(_sheet_bytes(args, iteration, 0), "image/png")],
+        "model_name": "fake",
+        "fallback_model": args.fallback,
+        "margin": 0,
+    }, secrets=_SECRETS)
+    job = _wait(service, job_id, args.poll)
+    return job["status"] == "done", job.get("error")
+
+
+def _battle_flow(service, session, iteration, args, stages):
+    """Tab 2: 대리점 등록 → 분석 → (화면) 승자/이상값 계산 → 엑셀 생성까지"""
+    from battle_engine import BattleBoard
+    from policy_data import PolicyData
+    from price_checks import AnomalyScanner
+
+    policies = [
+        PolicyData(f"S{session}-{iteration}-대리점{a}", _sheet_bytes(args, iteration, a), "#DDEEFF")
+        for a in range(args.agencies)
+    ]
+
+    started = time.perf_counter()
+    job_id = service.submit("battle_analysis", {
+        "model_name": "fake",
+        "fallback_model": args.fallback,
+        "batch": args.batch,
+        "policies": [
+            {"id": p.id, "name": p.name, "image_bytes": p.image_bytes, "pages": p.pages, "color_hex": p.color_hex}
+            for p in policies
+        ],
+    }, secrets=_SECRETS)
+    job = _wait(service, job_id, args.poll)
+    if job["status"] != "done":
+        return False, job.get("error")
+    result = service.result(job_id)
+    for p in policies:
+        if p.id in result["results"]:
+            p.apply_analysis(*result["results"][p.id])
+    stages["analysis"].append(time.perf_counter() - started)
+    analyzed = [p for p in policies if p.is_analyzed]
+    if result["errors"]:
+        first_error = next(iter(result["errors"].values())).splitlines()[0]
+        return False, f"분석 실패 {len(result['errors'])}곳 ({first_error})"
+
+    # 결과 화면 rerun 1회분 계산 (Streamlit 스크립트 스레드에서 하는 일)
+    started = time.perf_counter()
+    board = BattleBoard()
+    board.sync(analyzed)
+    board.winners_frame()
+    AnomalyScanner().scan(analyzed)
+    stages["screen"].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    export_policies = []
+    for p in analyzed:
+        light = copy.copy(p)
+        light.image_bytes = None
+        light.pages = None
+        export_policies.append(light)
+    job_id = service.submit("battle_export", {"policies": export_policies, "top_k": 3}, secrets=_SECRETS)
+    job = _wait(service, job_id, args.poll)
+    stages["export"].append(time.perf_counter() - started)
+    return job["status"] == "done", job.get("error")
+
+
+def run_scenario(name, args):
+    """시나리오 1개 실행 (현재 프로세스). 결과 dict 반환 - 작업 DB/결과물/저장소 폴더는 끝나면 삭제"""
+    with tempfile.TemporaryDirectory(prefix="sungzidang-load-", ignore_cleanup_errors=True) as workdir:
+        return _run_scenario(name, args, workdir)
+
+
+def _run_scenario(name, args, workdir):
+    from artifact_cache import ArtifactCache
+    from extractors import FakeExtractor
+    from gemini_parser import extract_price_sheet, parse_image_with_gemini_v2, parse_images_batch_with_gemini
+    from hedging import HedgedCaller
+    from job_service import JobService
+    from jobs import register_handlers
+    from single_flight import gemini_flight, upload_flight
+
+    fake_gemini = FakeExtractor(
+        args.latency, args.jitter, args.rate_429, seed=args.seed,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+    )
+    hedger = HedgedCaller(deadline=args.deadline)
+    fake_supabase = FakeSupabase(os.path.join(workdir, "storage"), args.db_latency)
+    service = JobService(db_path=os.path.join(workdir, "jobs.sqlite3"), max_workers=args.workers)
+    register_handlers(
+        service,
+        ArtifactCache(os.path.join(workdir, "artifacts")),
+        create_client=lambda url, key: fake_supabase,
+        extract_fn=partial(extract_price_sheet, extractor=fake_gemini, retry_delay=args.retry_delay),
+        parse_fn=partial(parse_image_with_gemini_v2, extractor=fake_gemini),
+        batch_parse_fn=partial(parse_images_batch_with_gemini, extractor=fake_gemini),
+        hedger=hedger,
+    )
+    service.start()
+
+    flow = _ocr_flow if name == "ocr" else _battle_flow
+    latencies, failures = [], []
+    stages = {"analysis": [], "screen": [], "export": []}
+    lock = threading.Lock()
+
+    def session(session_no):
+        for iteration in range(args.iterations):
+            started = time.perf_counter()
+            try:
+                ok, error = flow(service, session_no, iteration, args, stages)
+            except Exception as e:
+                ok, error = False, str(e)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    failures.append(str(error)[:80])
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=session, args=(s,)) for s in range(args.sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    service.shutdown()
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "completed": len(latencies),
+        "failed": len(failures),
+        "failures": sorted(set(failures))[:3],
+        "wall": wall,
+        "throughput": len(latencies) / wall if wall else 0.0,
+        "p50": _percentile(latencies, 0.50),
+        "p95": _percentile(latencies, 0.95),
+        "p99": _percentile(latencies, 0.99),
+        "stages": {k: _percentile(sorted(v), 0.50) for k, v in stages.items() if v},
+        "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "gemini_requests": fake_gemini.requests,
+        "routes": dict(hedger.wins, timeout=hedger.timeouts),
+        "coalesced": {"gemini": gemini_flight.shared, "upload": upload_flight.shared},
+    }
+
+
+def _child_args(args, scenario):
+    argv = [sys.executable, os.path.abspath(__file__), "--child", scenario]
+    for key in ["sessions", "iterations", "agencies", "workers", "latency", "jitter",
+                "rate_429", "retry_delay", "db_latency", "poll", "seed",
+                "slow_rate", "slow_latency", "deadline"]:
+        argv += [f"--{key.replace('_', '-')}", str(getattr(args, key))]
+    if args.batch:
+        argv.append("--batch")
+    if args.shared_sheets:
+        argv.append("--shared-sheets")
+    if args.fallback:
+        argv += ["--fallback", args.fallback]
+    return argv
+
+
+def _ms(value):
+    return f"{value * 1000:.0f}ms" if value is not None else "-"
+
+
+def main(args):
+    print(f"세션 {args.sessions}개 × {args.iterations}회, 작업 워커 {args.workers}개, "
+          f"Gemini 지연 {args.latency}s(+{args.jitter}s), 429 비율 {args.rate_429:.0%}"
+          + (", 배틀 배치 모드" if args.batch else "") + (", 같은 시세표 동시 업로드" if args.shared_sheets else ""))
+    for scenario in args.scenarios:
+        # 시나리오별 최대 메모리를 분리하기 위해 새 프로세스에서 실행
+        proc = subprocess.run(_child_args(args, scenario), cwd=APP_DIR, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"[{scenario}] 실행 실패:\n{proc.stderr[-2000:]}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"[{scenario}] 완료 {r['completed']}건 / 실패 {r['failed']}건, "
+              f"처리량 {r['throughput']:.2f}건/초 ({r['wall']:.1f}초)")
+        print(f"        지연 p50 {_ms(r['p50'])}, p95 {_ms(r['p95'])}, p99 {_ms(r['p99'])}, "
+              f"최대 메모리 {r['maxrss_mb']:.0f}MB, Gemini 요청 {r['gemini_requests']}건")
+        print("        호출 경로: " + ", ".join(f"{k} {v}" for k, v in r["routes"].items()))
+        print(f"        진행 중인 요청에 합침: Gemini {r['coalesced']['gemini']}건, 업로드 {r['coalesced']['upload']}건")
+        if r["stages"]:
+            print("        단계별 p50: " + ", ".join(f"{k} {_ms(v)}" for k, v in r["stages"].items()))
+        for failure in r["failures"]:
+            print(f"        실패 예: {failure}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="가짜 Gemini/Supabase로 동시 세션 부하 테스트")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--sessions", type=int, default=10, help="동시 세션(영업사원) 수")
+    parser.add_argument("--iterations", type=int, default=3, help="세션당 반복 횟수")
+    parser.add_argument("--agencies", type=int, default=4, help="배틀 1회당 대리점 수")
+    parser.add_argument("--workers", type=int, default=4, help="작업 큐 워커 수 (앱 기본값 4)")
+    parser.add_argument("--latency", type=float, default=1.0, help="Gemini 응답 지연(초)")
+    parser.add_argument("--jitter", type=float, default=0.5, help="지연에 더할 무작위 시간 최대값(초)")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="429 오류 비율 (0~1)")
+    parser.add_argument("--retry-delay", type=float, default=0.5, help="Tab 1 429 재시도 대기(초)")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="Supabase table 호출 지연(초)")
+    parser.add_argument("--poll", type=float, default=0.2, help="작업 상태 폴링 주기(초)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch", action="store_true", help="배틀 분석을 배치 모드(작은 시세표 묶음 요청)로 실행")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="응답이 멈추는 요청 비율 (0~1)")
+    parser.add_argument("--slow-latency", type=float, default=60.0, help="멈춘 요청의 지연(초)")
+    parser.add_argument("--deadline", type=float, default=90.0, help="Gemini 호출 1건 마감 시간(초)")
+    parser.add_argument("--fallback", default=None, help="보조 모델명 (지정 시 헤지 요청을 보조 모델로)")
+    parser.add_argument("--shared-sheets", action="store_true", help="모든 세션이 같은 회차에 같은 시세표를 올림")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_scenario(args.child, args), ensure_ascii=False))
+    else:
+        main(args)
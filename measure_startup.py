@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# 새 Streamlit 워커의 첫 화면 렌더링(콜드 스타트) 시간 측정
+# lazy: 현재 구조 (무거운 의존성은 첫 사용 시 로드)
+# eager: 기존처럼 genai/supabase/pandas/openpyxl을 맨 위에서 모두 불러온 경우
+# 사용법: python measure_startup.py --runs 5
+
+HEAVY_MODULES = ["google.generativeai", "supabase", "pandas", "openpyxl"]
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_CHILD_CODE = """
+import json, resource, sys, time
+from streamlit.testing.v1 import AppTest
+
+mode, heavy = sys.argv[1], json.loads(sys.argv[2])
+started = time.perf_counter()
+if mode == "eager":
+    import importlib
+    for name in heavy:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+at = AppTest.from_file("app.py", default_timeout=120)
+# 빈 설정값으로 전체 화면을 렌더링 (네트워크 호출 없음)
+for key in ["GEMINI_API_KEY", "SUPABASE_URL", "SUPABASE_KEY"]:
+    at.secrets[key] = ""
+at.run()
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "elapsed": elapsed,
+    "loaded": [name for name in heavy if name in sys.modules],
+    "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "error": [str(e.value) for e in at.exception],
+}))
+"""
+
+
+def measure(mode):
+    """새 프로세스에서 한 번 측정 (import 캐시가 없는 콜드 상태)"""
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD_CODE, mode, json.dumps(HEAVY_MODULES)],
+        cwd=APP_DIR, capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(runs):
+    summary = {}
+    for mode in ["eager", "lazy"]:
+        samples = [measure(mode) for _ in range(runs)]
+        elapsed = statistics.median(s["elapsed"] for s in samples)
+        rss = statistics.median(s["maxrss_mb"] for s in samples)
+        summary[mode] = elapsed
+        print(f"[{mode}] 첫 렌더링 {elapsed * 1000:.0f}ms (중앙값, {runs}회), 최대 메모리 {rss:.0f}MB")
+        print(f"        로드된 무거운 모듈: {', '.join(samples[-1]['loaded']) or '없음'}")
+        if samples[-1]["error"]:
+            print(f"        앱 오류: {samples[-1]['error']}")
+
+    if summary["lazy"]:
+        print(f"개선: {summary['eager'] / summary['lazy']:.2f}배 ({(summary['eager'] - summary['lazy']) * 1000:.0f}ms 단축)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="app.py 콜드 스타트 시간 측정")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    main(args.runs)
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import threading
+
+from single_flight import upload_flight
+
+# --- 내용 해시 기반 Storage 저장 (같은 내용은 한 번만 업로드) ---
+# 키 형식: "{prefix}/{sha256}.{ext}" (엑셀은 입력 내용 해시 = artifact_cache 키 사용)
+# 이미 있는 객체는 목록 조회 1번으로 확인하고 업로드를 생략한다.
+# 여러 세션이 같은 키를 동시에 올리면 확인/업로드는 한 번만 하고 나머지는 그 결과를 기다린다 (upload_flight).
+# storage 인자는 supabase client.storage와 같은 모양(from_(bucket).upload/list/get_public_url)이면 된다.
+
+# 이 프로세스에서 이미 존재를 확인한 객체 (bucket, key) - 목록 조회도 생략
+_known_objects = set()
+_known_lock = threading.Lock()
+
+
+def content_key(prefix, data, ext):
+    """내용 해시로 저장 키 생성"""
+    return f"{prefix}/{hashlib.sha256(data).hexdigest()}.{ext}"
+
+
+def _is_duplicate_error(e):
+    error_msg = str(e)
+    return "Duplicate" in error_msg or "already exists" in error_msg or "409" in error_msg
+
+
+def object_exists(bucket_api, key):
+    """버킷에 같은 키의 객체가 있는지 (목록 조회 1번)"""
+    folder, _, name = key.rpartition("/")
+    try:
+        entries = bucket_api.list(folder, {"search": name})
+    except Exception:
+        return False
+    return any(entry.get("name") == name for entry in entries or [])
+
+
+def put_object(storage, bucket, key, data, content_type):
+    """
+    키가 없을 때만 업로드하고 공개 URL 반환.
+    이 프로세스에서 같은 키를 올리는 중이면 그 업로드를 기다리고,
+    다른 프로세스와 동시에 올려 중복 오류가 나면 이미 저장된 것으로 간주한다.
+    """
+    bucket_api = storage.from_(bucket)
+    with _known_lock:
+        known = (bucket, key) in _known_objects
+    if not known:
+        upload_flight.do((bucket, key), lambda: _upload_once(bucket_api, bucket, key, data, content_type))
+    return bucket_api.get_public_url(key)
+
+
+def _upload_once(bucket_api, bucket, key, data, content_type):
+    if not object_exists(bucket_api, key):
+        try:
+            bucket_api.upload(key, data, {"content-type": content_type})
+        except Exception as e:
+            if not _is_duplicate_error(e):
+                raise
+    with _known_lock:
+        _known_objects.add((bucket, key))
+
+
+def put_content(storage, bucket, prefix, data, content_type, ext):
+    """내용 해시 키로 저장하고 공개 URL 반환"""
+    return put_object(storage, bucket, content_key(prefix, data, ext), data, content_type)
+
+
+class LocalBucket:
+    """로컬 폴더로 흉내 낸 Storage 버킷 (Supabase와 같이 같은 키 재업로드는 오류)"""
+
+    def __init__(self, root, public_base):
+        self.root = root
+        self.public_base = public_base
+        self.uploads = 0  # 실제 업로드(전송) 횟수
+
+    def upload(self, path, data, file_options=None):
+        full_path = os.path.join(self.root, path)
+        if os.path.exists(full_path):
+            raise FileExistsError(f"Duplicate: The resource already exists ({path})")
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as f:
+            f.write(data)
+        self.uploads += 1
+
+    def list(self, path=None, options=None):
+        folder = os.path.join(self.root, path or "")
+        if not os.path.isdir(folder):
+            return []
+        search = (options or {}).get("search", "")
+        return [{"name": name} for name in sorted(os.listdir(folder)) if search in name]
+
+    def get_public_url(self, path):
+        return f"{self.public_base}/{path}"
+
+
+class LocalStorage:
+    """supabase client.storage 대역: from_(bucket)으로 LocalBucket 반환"""
+
+    def __init__(self, root, public_base="http://localhost/storage"):
+        self.root = root
+        self.public_base = public_base
+        self._buckets = {}
+
+    def from_(self, bucket):
+        if bucket not in self._buckets:
+            self._buckets[bucket] = LocalBucket(
+                os.path.join(self.root, bucket), f"{self.public_base}/{bucket}"
+            )
+        return self._buckets[bucket]
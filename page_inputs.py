@@ -0,0 +1,173 @@
+import importlib.util
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 여러 페이지 시세표 입력 (PDF / 이미지 여러 장) ---
+# 대리점 시세표 1건 = 페이지 목록 [(bytes, mime_type), ...]
+# PDF는 PyMuPDF(fitz)가 있으면 페이지별 PNG로 변환하고, 없으면 PDF 그대로 한 페이지로 보낸다 (Gemini가 PDF를 직접 읽음, 앱에서 경고 표시).
+# 페이지들은 동시에 분석한 뒤 대리점별 DataFrame/조건문 하나로 합친다.
+# 배치 모드에서는 여러 대리점의 작은 페이지를 묶어 Gemini 요청 1건으로 보낸다 (plan_batches).
+
+PDF_MIME = "application/pdf"
+UPLOAD_TYPES = ['png', 'jpg', 'jpeg', 'pdf']
+
+# 대리점 1곳의 페이지를 동시에 분석할 최대 개수
+MAX_PAGE_WORKERS = 4
+PDF_DPI = 150
+
+# 배치 모드: 작은 시세표 여러 장을 Gemini 요청 1건으로 묶는 기준
+SMALL_SHEET_BYTES = 512 * 1024  # 이보다 큰 페이지는 단독 분석
+MAX_BATCH_SHEETS = 8
+MAX_BATCH_BYTES = 4 * 1024 * 1024  # 요청 1건에 담을 이미지 용량 (inline 데이터 한도 20MB보다 여유 있게)
+BATCH_OUTPUT_TOKENS = 8192  # 응답 1건의 출력 토큰 한도
+OUTPUT_TOKEN_MARGIN = 0.8  # 한도 중 묶음 계획에 쓰는 비율
+CHARS_PER_TOKEN = 3  # 응답 길이로 출력 토큰을 추정할 때의 대략값 (숫자/한글 JSON)
+
+_EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", PDF_MIME: "pdf"}
+
+
+def pdf_rasterize_available():
+    """PDF를 페이지별 이미지로 나눌 수 있는지 (PyMuPDF 필요)"""
+    return importlib.util.find_spec("fitz") is not None
+
+
+def page_extension(mime_type):
+    return _EXTENSIONS.get(mime_type, "jpg")
+
+
+def guess_mime(filename, mime_type=None):
+    """업로드 파일의 MIME 타입 (브라우저가 알려주지 않으면 확장자로 추정)"""
+    if mime_type:
+        return mime_type
+    ext = filename.rsplit('.', 1)[-1].lower()
+    if ext == "pdf":
+        return PDF_MIME
+    if ext == "png":
+        return "image/png"
+    return "image/jpeg"
+
+
+def rasterize_pdf(pdf_bytes, dpi=PDF_DPI):
+    """PDF를 페이지별 PNG bytes 목록으로 변환 (PyMuPDF 필요)"""
+    import fitz
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [page.get_pixmap(dpi=dpi).tobytes("png") for page in doc]
+
+
+def expand_pages(files):
+    """
+    업로드 파일 목록 [(bytes, mime_type), ...]을 분석할 페이지 목록으로 펼침.
+    PDF는 가능하면 페이지별 이미지로 나눈다.
+    """
+    pages = []
+    for data, mime_type in files:
+        if mime_type == PDF_MIME and pdf_rasterize_available():
+            pages.extend((png, "image/png") for png in rasterize_pdf(data))
+        else:
+            pages.append((data, mime_type))
+    return pages
+
+
+def map_pages(pages, fn, max_workers=MAX_PAGE_WORKERS):
+    """페이지마다 fn(bytes, mime_type)을 동시에 실행하고 페이지 순서대로 결과 반환"""
+    if len(pages) <= 1:
+        return [fn(data, mime_type) for data, mime_type in pages]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pages))) as pool:
+        futures = [pool.submit(fn, data, mime_type) for data, mime_type in pages]
+        return [f.result() for f in futures]
+
+
+def merge_page_frames(results):
+    """
+    페이지별 (df, footer)를 대리점 1곳의 결과로 합침.
+    - 조건(열)은 처음 나온 순서대로 합집합
+    - 여러 페이지에 같은 모델이 있으면 한 행으로 합치고, 같은 칸이 겹치면 앞 페이지 값을 사용
+    - 조건문은 페이지 순서대로 이어 붙임 (중복 제외)
+    """
+    import pandas as pd
+
+    if len(results) == 1:
+        return results[0]
+
+    frames = [df for df, _ in results if df is not None and not df.empty]
+    footers = []
+    for _, footer in results:
+        if footer and footer not in footers:
+            footers.append(footer)
+    footer_text = "\n\n".join(footers)
+
+    if not frames:
+        return results[0][0], footer_text
+
+    index_name = frames[0].index.name
+    merged = pd.concat(frames, sort=False)
+    # 한 페이지 안에서 같은 모델이 여러 번 나오는 경우(다른 섹션)는 그대로 두고, 페이지 간 중복만 합침
+    page_rows = [df.groupby(level=0, sort=False).cumcount() for df in frames]
+    occurrence = pd.concat(page_rows).to_numpy()
+    merged = merged.set_index(occurrence, append=True)
+    merged = merged.groupby(level=[0, 1], sort=False).first()
+    merged.index = merged.index.get_level_values(0)
+    merged.index.name = index_name
+    return merged, footer_text
+
+
+def merge_page_json(results):
+    """Tab 1 추출 결과(top_data/bottom_data/footer_lines)를 페이지 순서대로 합침"""
+    if len(results) == 1:
+        return results[0]
+    merged = {"top_data": [], "bottom_data": [], "footer_lines": []}
+    for data in results:
+        merged["top_data"].extend(data.get("top_data") or [])
+        merged["bottom_data"].extend(data.get("bottom_data") or [])
+        for line in data.get("footer_lines") or []:
+            if line not in merged["footer_lines"]:
+                merged["footer_lines"].append(line)
+    return merged
+
+
+class SheetTokenEstimator:
+    """시세표 1장당 출력 토큰 추정값. 관측한 응답 길이로 갱신하고, 응답이 잘리면 크게 올린다"""
+
+    def __init__(self, tokens_per_sheet=1500):
+        self.tokens_per_sheet = tokens_per_sheet
+        self._lock = threading.Lock()
+
+    def observe(self, text, sheet_count):
+        tokens = len(text) / CHARS_PER_TOKEN / max(sheet_count, 1)
+        with self._lock:
+            self.tokens_per_sheet = 0.7 * self.tokens_per_sheet + 0.3 * tokens
+
+    def truncated(self, sheet_count):
+        with self._lock:
+            self.tokens_per_sheet = max(self.tokens_per_sheet * 1.5, BATCH_OUTPUT_TOKENS / max(sheet_count, 1))
+
+    def max_sheets(self):
+        """출력 토큰 한도 안에 들어갈 묶음당 최대 장 수"""
+        budget = BATCH_OUTPUT_TOKENS * OUTPUT_TOKEN_MARGIN
+        return max(1, min(MAX_BATCH_SHEETS, int(budget // self.tokens_per_sheet)))
+
+
+# 프로세스 전체에서 공유 (작업 워커 스레드들이 함께 갱신)
+sheet_token_estimator = SheetTokenEstimator()
+
+
+def plan_batches(sizes, estimator=None):
+    """
+    페이지 크기(bytes) 목록을 묶음 [[페이지 번호, ...], ...]으로 나눔.
+    큰 페이지는 1장짜리 묶음, 작은 페이지는 장 수(출력 토큰)와 용량 한도 안에서 순서대로 묶는다.
+    """
+    limit = (estimator or sheet_token_estimator).max_sheets()
+    batches, current, current_bytes = [], [], 0
+    for i, size in enumerate(sizes):
+        if size > SMALL_SHEET_BYTES or limit == 1:
+            batches.append([i])
+            continue
+        if current and (len(current) >= limit or current_bytes + size > MAX_BATCH_BYTES):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(i)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# --- 이전 분석 결과 재사용 (policy_uploads.parsed_data + 로컬 캐시) ---
+# parsed_data 형식: df.to_json(orient='split') + "footer" (조건문)
+# 로컬 캐시(.cache/parses)를 먼저 보고, 없거나 오래되면 Supabase policy_uploads에서 가져온다.
+#   - agency/  : 대리점별 최근 분석 결과 ("최근 분석 불러오기")
+#   - content/ : 시세표 내용(페이지 해시) + Gemini 모델별 분석 결과 (같은 시세표 재분석 생략)
+# 대리점별 최근 결과가 바뀌면 subscribe()로 등록한 함수에 알린다 (전체 최고가 뷰 갱신용)
+
+DEFAULT_PARSE_DIR = os.path.join(".cache", "parses")
+
+# 로컬 캐시의 대리점별 결과를 DB 확인 없이 믿는 시간 (다른 서버에서 올린 결과 반영용)
+LOCAL_MAX_AGE = 6 * 3600
+
+
+def parsed_payload(df, footer_text):
+    """DataFrame/조건문을 policy_uploads.parsed_data 형식(dict)으로"""
+    parsed = json.loads(df.to_json(orient='split', force_ascii=False))
+    parsed["footer"] = footer_text or ""
+    return parsed
+
+
+def frame_from_parsed(parsed):
+    """parsed_data에서 (df, footer_text) 복원"""
+    import pandas as pd
+
+    df = pd.DataFrame(parsed.get("data") or [], index=parsed.get("index"), columns=parsed.get("columns"))
+    df = df.apply(pd.to_numeric, errors='coerce')
+    return df, parsed.get("footer") or ""
+
+
+def pages_key(pages, model_name):
+    """시세표 페이지 내용 + 모델명으로 분석 결과 키 생성"""
+    h = hashlib.sha256(str(model_name).encode('utf-8'))
+    for data, _ in pages:
+        h.update(hashlib.sha256(data).digest())
+    return h.hexdigest()
+
+
+class ParseStore:
+    """분석 결과 저장소: 로컬 JSON 캐시 + (선택) Supabase policy_uploads 조회"""
+
+    def __init__(self, cache_dir=DEFAULT_PARSE_DIR, local_max_age=LOCAL_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.local_max_age = local_max_age
+        self._lock = threading.Lock()
+        self._listeners = []
+        for kind in ("agency", "content"):
+            os.makedirs(os.path.join(cache_dir, kind), exist_ok=True)
+
+    def _path(self, kind, key):
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, kind, f"{name}.json")
+
+    def _read(self, kind, key):
+        try:
+            with open(self._path(kind, key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write(self, kind, key, record):
+        path = self._path(kind, key)
+        tmp_path = f"{path}.tmp.{threading.get_ident()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def subscribe(self, listener):
+        """대리점별 최근 결과가 저장될 때마다 listener(record) 호출"""
+        self._listeners.append(listener)
+
+    def _notify(self, record):
+        for listener in self._listeners:
+            try:
+                listener(record)
+            except Exception:
+                continue  # 알림 받는 쪽 오류가 분석 결과 저장을 막지 않도록
+
+    def save(self, agency_name, parsed, content_key=None):
+        """분석 직후 로컬 캐시에 기록 (대리점별 최근 결과 + 내용 키)"""
+        record = {"agency_name": agency_name, "parsed": parsed, "saved_at": time.time(), "source": "local"}
+        with self._lock:
+            self._write("agency", agency_name, record)
+            if content_key:
+                self._write("content", content_key, record)
+        self._notify(record)
+
+    def by_content(self, content_key):
+        """같은 시세표(페이지 내용 + 모델)를 분석한 결과가 있으면 반환"""
+        return self._read("content", content_key)
+
+    def latest(self, agency_name, client=None):
+        """
+        대리점의 최근 분석 결과 {"agency_name", "parsed", "saved_at", "source"}.
+        로컬 캐시가 없거나 오래됐으면 DB에서 가져와 로컬에 저장한다. 없으면 None
+        """
+        local = self._read("agency", agency_name)
+        if local and time.time() - local.get("saved_at", 0) < self.local_max_age:
+            return local
+        if client is None:
+            return local
+
+        try:
+            rows = (
+                client.table("policy_uploads")
+                .select("agency_name, parsed_data, created_at")
+                .eq("agency_name", agency_name)
+                .order("created_at", desc=True)
+                .limit(1)
+                .execute()
+                .data
+            )
+        except Exception:
+            return local
+        if not rows or not rows[0].get("parsed_data"):
+            return local
+
+        record = {
+            "agency_name": agency_name,
+            "parsed": rows[0]["parsed_data"],
+            "saved_at": time.time(),
+            "source": rows[0].get("created_at") or "db",
+        }
+        with self._lock:
+            self._write("agency", agency_name, record)
+        self._notify(record)
+        return record
+
+    def records(self):
+        """로컬 캐시의 대리점별 최근 결과 전체 (저장 시각 순)"""
+        records = []
+        agency_dir = os.path.join(self.cache_dir, "agency")
+        for file_name in os.listdir(agency_dir):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(agency_dir, file_name), 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if record.get("agency_name") and record.get("parsed"):
+                records.append(record)
+        return sorted(records, key=lambda record: record.get("saved_at", 0))
+
+    def agencies(self, client=None, limit=200):
+        """불러올 수 있는 대리점 이름 목록 (로컬 캐시 + DB 최근 기록)"""
+        names = set()
+        agency_dir = os.path.join(self.cache_dir, "agency")
+        for file_name in os.listdir(agency_dir):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(agency_dir, file_name), 'r', encoding='utf-8') as f:
+                    names.add(json.load(f)["agency_name"])
+            except (OSError, ValueError, KeyError):
+                continue
+
+        if client is not None:
+            try:
+                rows = (
+                    client.table("policy_uploads")
+                    .select("agency_name")
+                    .order("created_at", desc=True)
+                    .limit(limit)
+                    .execute()
+                    .data
+                )
+                names.update(row["agency_name"] for row in rows or [] if row.get("agency_name"))
+            except Exception:
+                pass
+        return sorted(names)
@@ -0,0 +1,73 @@
+import uuid
+
+from policy_diff import diff_frames
+
+
+# --- 데이터 구조 클래스 ---
+class PolicyData:
+    def __init__(self, name, image_bytes, color_hex, pages=None):
+        self.name = name
+        self.image_bytes = image_bytes  # 원본 이미지 저장 (AI 분석은 나중에)
+        # 여러 장/PDF 시세표: [(bytes, mime_type), ...] (없으면 image_bytes 1장, 저장된 분석을 불러온 경우 빈 목록)
+        self.pages = pages if pages is not None else [(image_bytes, "image/jpeg")]
+        self.color_hex = color_hex
+        # 분석 결과는 나중에 채워짐
+        self.df = None
+        self.footer_text = None
+        self.is_analyzed = False
+        # 필터 상태 (비어 있으면 전체 선택)
+        self.id = str(uuid.uuid4())
+        self.selected_models = None
+        self.selected_columns = None
+        self._options_cache = None  # (df, 모델 목록, 조건 목록)
+        self.excluded_cells = None  # 승자 후보에서 뺄 이상값 칸 {(행 라벨, 순번, 컬럼)}
+        # 같은 대리점의 새 시세표 (기존 분석 결과는 비교를 위해 유지)
+        self.needs_update = False
+        self.last_diff = None  # 직전 업로드 대비 변경 내역 (PolicyDiff)
+
+    def stage_reupload(self, image_bytes, pages=None):
+        """같은 대리점의 새 시세표 등록. 다음 분석 때 기존 결과와 비교해 반영"""
+        self.image_bytes = image_bytes
+        self.pages = pages or [(image_bytes, "image/jpeg")]
+        self.needs_update = self.is_analyzed
+
+    def apply_analysis(self, df, footer_text):
+        """분석 결과 반영 후 필터를 전체 선택으로 초기화 (재업로드면 변경분만 반영)"""
+        if self.is_analyzed and self.df is not None:
+            self._apply_update(df, footer_text)
+            return
+        self.df = df
+        self.footer_text = footer_text
+        self.is_analyzed = True
+        if df is not None:
+            self.selected_models = df.index.tolist()
+            self.selected_columns = df.columns.tolist()
+
+    def _apply_update(self, df, footer_text):
+        """직전 결과와 비교해 변경 내역을 남기고, 기존 필터 선택은 유지 (새 항목은 포함)"""
+        self.last_diff = diff_frames(self.df, df)
+        if df is not None:
+            self.selected_models = self._carry_selection(self.selected_models, self.df.index, df.index)
+            self.selected_columns = self._carry_selection(self.selected_columns, self.df.columns, df.columns)
+        self.df = df
+        self.footer_text = footer_text
+        self.needs_update = False
+
+    @staticmethod
+    def _carry_selection(selected, old_options, new_options):
+        if not selected:
+            return list(new_options)
+        old_set = set(old_options)
+        keep = set(selected)
+        return [x for x in new_options if x in keep or x not in old_set]
+
+    def filter_options(self):
+        """필터 선택지 (모델 목록, 조건 목록). df가 바뀔 때만 다시 계산"""
+        cache = getattr(self, '_options_cache', None)
+        if cache is None or cache[0] is not self.df:
+            if self.df is None:
+                cache = (None, [], [])
+            else:
+                cache = (self.df, self.df.index.tolist(), self.df.columns.tolist())
+            self._options_cache = cache
+        return cache[1], cache[2]
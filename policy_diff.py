@@ -0,0 +1,161 @@
+from battle_engine import classify_column, normalize_model_name
+
+# --- 같은 대리점의 연속 업로드 간 가격 변경 비교 ---
+# 모델은 정규화된 모델명, 조건은 (가입유형, 카테고리/조건, 요금제) 구조 키로 맞춘 뒤 비교한다.
+# 컬럼명 형식: "Sub|Cond(Plan)" (parse_image_with_gemini_v2 참고)
+# pandas는 실제 비교 시점에 로드한다.
+
+ADDED = "추가"
+REMOVED = "삭제"
+CHANGED = "변경"
+
+DIFF_COLUMNS = ["구분", "모델명", "조건", "이전 가격", "새 가격", "차이"]
+
+
+def canonical_model(idx):
+    """비교용 모델 키 (공백 차이 무시). 무효한 이름이면 None"""
+    name = normalize_model_name(idx)
+    if not name:
+        return None
+    return " ".join(name.split()).upper()
+
+
+def column_key(col):
+    """비교용 조건 키: (가입유형, 카테고리 또는 조건, 요금제)"""
+    col_str = " ".join(str(col).split())
+    sub, _, cond = col_str.rpartition("|")
+    category, plan_name = classify_column(col_str)
+    if "(" in cond:
+        cond = cond.split("(")[0]
+    return (sub.strip(), category or cond.strip(), plan_name.strip())
+
+
+def _keyed_prices(df):
+    """
+    df를 (모델 키 × 조건 키) 숫자 표로 변환. 키 → 원래 라벨 매핑도 함께 반환
+    같은 모델이 여러 번 나오면(섹션이 나뉜 시세표) 두 번째부터 "키#순번"으로, 같은 조건 키는 (키..., 순번)으로 따로 비교한다.
+    """
+    import pandas as pd
+
+    model_labels = {}
+    rows = []
+    seen = {}
+    for pos, idx in enumerate(df.index):
+        key = canonical_model(idx)
+        if not key:
+            continue
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        model_labels[f"{key}#{occurrence}" if occurrence else key] = idx
+        rows.append(pos)
+
+    # 조건도 같은 키가 여러 번 나오면(예: "공시 MNP"와 "공시 번이 MNP") 순번을 붙여 따로 비교
+    col_labels = {}
+    seen = {}
+    for col in df.columns:
+        key = column_key(col)
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        col_labels[key + (occurrence,)] = col
+    cols = list(range(len(df.columns)))
+
+    prices = df.iloc[rows, cols].apply(pd.to_numeric, errors='coerce')
+    prices.index = list(model_labels)
+    prices.columns = pd.MultiIndex.from_tuples(list(col_labels)) if col_labels else []
+    return prices, model_labels, col_labels
+
+
+class PolicyDiff:
+    """
+    두 분석 결과의 차이.
+    entries: [(구분, 모델명, 조건, 이전 가격, 새 가격), ...]
+    models: 값이 바뀐 모델의 배틀용 이름 집합 (이전/새 라벨 모두 포함)
+    """
+
+    def __init__(self, old_df, new_df, entries, models):
+        self.old_df = old_df
+        self.new_df = new_df
+        self.entries = entries
+        self.models = models
+
+    def count(self, kind):
+        return sum(1 for entry in self.entries if entry[0] == kind)
+
+    def is_empty(self):
+        return not self.entries
+
+    def summary(self):
+        """현황판 표시용 한 줄 요약"""
+        if self.is_empty():
+            return "변경 없음"
+        return f"변경 {self.count(CHANGED)}건 · 추가 {self.count(ADDED)}건 · 삭제 {self.count(REMOVED)}건"
+
+    def to_frame(self):
+        """변경 내역 DataFrame (차이 = 새 가격 - 이전 가격)"""
+        import pandas as pd
+
+        rows = []
+        for kind, model, col, old, new in self.entries:
+            gap = new - old if kind == CHANGED else None
+            rows.append((kind, model, col, old, new, gap))
+        return pd.DataFrame(rows, columns=DIFF_COLUMNS)
+
+
+def diff_frames(old_df, new_df):
+    """
+    직전 분석 결과(old_df)와 새 분석 결과(new_df)를 모델/조건 키로 맞춰 비교.
+    가격이 새로 생기면 추가, 사라지면 삭제, 값이 다르면 변경으로 분류한다.
+    """
+    import pandas as pd
+
+    empty_old = old_df is None or old_df.empty
+    empty_new = new_df is None or new_df.empty
+    if empty_old and empty_new:
+        return PolicyDiff(old_df, new_df, [], set())
+    if empty_old:
+        old_df = pd.DataFrame(index=[], columns=new_df.columns)
+    if empty_new:
+        new_df = pd.DataFrame(index=[], columns=old_df.columns)
+
+    old_prices, old_models, old_cols = _keyed_prices(old_df)
+    new_prices, new_models, new_cols = _keyed_prices(new_df)
+
+    # 합집합 기준으로 정렬 (새 업로드 순서 우선, 사라진 항목은 뒤에)
+    model_keys = list(new_models) + [k for k in old_models if k not in new_models]
+    col_keys = list(new_cols) + [k for k in old_cols if k not in new_cols]
+    col_index = pd.MultiIndex.from_tuples(col_keys)
+    old_aligned = old_prices.reindex(index=model_keys, columns=col_index).to_numpy(dtype=float)
+    new_aligned = new_prices.reindex(index=model_keys, columns=col_index).to_numpy(dtype=float)
+
+    old_has = ~pd.isna(old_aligned)
+    new_has = ~pd.isna(new_aligned)
+    masks = [
+        (ADDED, new_has & ~old_has),
+        (REMOVED, old_has & ~new_has),
+        (CHANGED, old_has & new_has & (old_aligned != new_aligned)),
+    ]
+
+    entries = []
+    touched = set()
+    for kind, mask in masks:
+        for r, c in zip(*mask.nonzero()):
+            model_key, col_key = model_keys[r], col_keys[c]
+            label = new_models.get(model_key, old_models.get(model_key))
+            col = new_cols.get(col_key, old_cols.get(col_key))
+            old = float(old_aligned[r, c]) if old_has[r, c] else None
+            new = float(new_aligned[r, c]) if new_has[r, c] else None
+            entries.append((kind, normalize_model_name(label), col, old, new))
+            touched.add(model_key)
+
+    # 배틀 계산기가 다시 축약해야 할 모델 (양쪽 라벨이 다를 수 있으므로 모두 포함)
+    models = set()
+    for key in touched:
+        for labels in (old_models, new_models):
+            if key in labels:
+                models.add(normalize_model_name(labels[key]))
+
+    order = {}
+    for pos, key in enumerate(model_keys):
+        order.setdefault(canonical_model(new_models.get(key, old_models.get(key))), pos)
+    entries.sort(key=lambda e: order.get(canonical_model(e[1]), len(order)))
+    return PolicyDiff(old_df, new_df, entries, models)
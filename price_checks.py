@@ -0,0 +1,185 @@
+from battle_engine import NO_PRICE, classify_column, normalize_model_name, row_occurrences
+
+# --- 배틀 전 OCR 이상값 검사 ---
+# 승자는 단순 최대값이므로 "150"을 "1500"으로 잘못 읽은 칸 하나가 카테고리 전체를 이긴다.
+# 분석된 모든 대리점의 값을 한 번에 모아 (벡터 연산) 다음을 표시한다.
+#   - 단위 의심: 만원 단위 표에 원 단위 값이 섞인 경우 (절대값 UNIT_WON_THRESHOLD 이상)
+#   - 범위 초과: 만원 단위로도 나올 수 없는 값 (절대값 MAX_PRICE 초과)
+#   - 이상치: 모델×카테고리별 대리점 간 중앙값/MAD 기준 robust z-score가 OUTLIER_Z 초과
+
+# 가격 단위는 만원 (예: 15 = 15만원)
+MAX_PRICE = 300
+UNIT_WON_THRESHOLD = 1000
+
+# 이상치 판정 기준 (대리점이 MIN_AGENCIES곳 이상일 때만)
+OUTLIER_Z = 3.5
+MIN_AGENCIES = 3
+MIN_SCALE = 5  # MAD가 0에 가까울 때 최소 허용 편차 (만원)
+
+UNIT = "단위 의심(원)"
+IMPOSSIBLE = "범위 초과"
+OUTLIER = "이상치"
+
+ANOMALY_COLUMNS = ["대리점", "모델명", "조건", "값", "사유", "기준값"]
+
+
+class AnomalyReport:
+    """
+    검사 결과.
+    rows: [(정책 키, 대리점명, 행 라벨, 순번, 컬럼, 값, 사유, 기준값), ...]
+    순번: 같은 라벨 행 중 몇 번째인지 (섹션이 나뉘어 같은 모델이 여러 번 나오는 시세표 구분용)
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self._cells = {}
+        for key, _, label, occurrence, col, _, _, _ in rows:
+            self._cells.setdefault(key, set()).add((label, occurrence, col))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def cells(self, policy_key):
+        """해당 대리점의 의심 칸 {(행 라벨, 순번, 컬럼)}"""
+        return frozenset(self._cells.get(policy_key, ()))
+
+    def to_frame(self):
+        import pandas as pd
+
+        rows = [row[1:3] + row[4:] for row in self.rows]
+        return pd.DataFrame(rows, columns=ANOMALY_COLUMNS)
+
+    def highlight(self, policy_key, df, color="#FFB3B3"):
+        """
+        미리보기 표의 의심 칸에 배경색을 입힌 Styler (df는 필터 적용된 부분이어도 됨)
+        Styler는 중복 라벨을 받지 않으므로 두 번째부터 "라벨 #순번"으로 표시한다.
+        """
+        cells = self._cells.get(policy_key, set())
+        positions = {key: pos for pos, key in enumerate(zip(df.index, row_occurrences(df.index)))}
+        marked = []
+        for label, occurrence, col in cells:
+            pos = positions.get((label, occurrence))
+            if pos is not None:
+                marked.extend((pos, j) for j, c in enumerate(df.columns) if c == col)
+        if not df.index.is_unique or not df.columns.is_unique:
+            df = df.copy()
+            df.index = _unique_labels(df.index)
+            df.columns = _unique_labels(df.columns)
+
+        def style(frame):
+            import pandas as pd
+
+            styles = pd.DataFrame("", index=frame.index, columns=frame.columns)
+            for i, j in marked:
+                styles.iloc[i, j] = f"background-color: {color}"
+            return styles
+
+        return df.style.apply(style, axis=None)
+
+
+def _unique_labels(labels):
+    return [
+        label if n == 0 else f"{label} #{n + 1}"
+        for label, n in zip(labels, row_occurrences(labels))
+    ]
+
+
+def _policy_key(p):
+    return getattr(p, 'id', None) or id(p)
+
+
+def _numeric_values(df):
+    import pandas as pd
+
+    try:
+        return df.to_numpy(dtype=float)
+    except (TypeError, ValueError):
+        return df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+
+def detect_anomalies(policies):
+    """분석된 대리점 전체를 한 번에 검사해 AnomalyReport 반환"""
+    import numpy as np
+    import pandas as pd
+
+    # 모든 칸을 (대리점, 행, 열, 모델×카테고리 그룹, 값) 1차원 배열로 펼침
+    policy_idx, row_idx, col_idx, group_keys, values = [], [], [], [], []
+    occurrences = {}  # 대리점 번호 -> 행별 같은 라벨 중 순번
+    for p_idx, p in enumerate(policies):
+        df = p.df
+        if df is None or df.empty:
+            continue
+        grid = _numeric_values(df)
+        n_rows, n_cols = grid.shape
+        models = [normalize_model_name(idx) for idx in df.index]
+        categories = [classify_column(col)[0] for col in df.columns]
+        policy_idx.append(np.full(n_rows * n_cols, p_idx))
+        row_idx.append(np.repeat(np.arange(n_rows), n_cols))
+        col_idx.append(np.tile(np.arange(n_cols), n_rows))
+        group_keys.extend(
+            (m, c) if m and c else None for m in models for c in categories
+        )
+        values.append(grid.ravel())
+        occurrences[p_idx] = row_occurrences(df.index)
+    if not values:
+        return AnomalyReport([])
+
+    policy_idx = np.concatenate(policy_idx)
+    row_idx = np.concatenate(row_idx)
+    col_idx = np.concatenate(col_idx)
+    values = np.concatenate(values)
+    # 모델×카테고리 그룹을 정수 코드로 (-1: 모델명이 없거나 4대 카테고리가 아님)
+    group = pd.factorize(pd.Series(group_keys, dtype=object), use_na_sentinel=True)[0]
+
+    finite = np.isfinite(values)
+    magnitude = np.abs(np.where(finite, values, 0))
+    reason = np.full(len(values), None, dtype=object)
+    expected = np.full(len(values), np.nan)
+
+    # 1. 단위/범위 검사
+    is_unit = finite & (magnitude >= UNIT_WON_THRESHOLD)
+    reason[is_unit] = UNIT
+    expected[is_unit] = np.round(values[is_unit] / 10000, 1)
+    reason[finite & ~is_unit & (magnitude > MAX_PRICE)] = IMPOSSIBLE
+
+    # 2. 모델×카테고리별 대리점 간 robust 이상치 (단위/범위 문제 칸과 승자 후보가 아닌 값은 제외)
+    pool = np.flatnonzero(finite & (magnitude <= MAX_PRICE) & (values > NO_PRICE) & (group >= 0))
+    if len(pool):
+        pool_values = pd.Series(values[pool])
+        pool_group = group[pool]
+        median = pool_values.groupby(pool_group).transform("median").to_numpy()
+        deviation = np.abs(values[pool] - median)
+        mad = pd.Series(deviation).groupby(pool_group).transform("median").to_numpy()
+        agencies = pd.Series(policy_idx[pool]).groupby(pool_group).transform("nunique").to_numpy()
+        scale = np.maximum(mad * 1.4826, MIN_SCALE)
+        is_outlier = (agencies >= MIN_AGENCIES) & (deviation / scale > OUTLIER_Z)
+        reason[pool[is_outlier]] = OUTLIER
+        expected[pool[is_outlier]] = median[is_outlier]
+
+    rows = []
+    for i in np.flatnonzero(pd.notna(reason)):
+        p = policies[policy_idx[i]]
+        ref = expected[i]
+        rows.append((
+            _policy_key(p), p.name, p.df.index[row_idx[i]], occurrences[policy_idx[i]][row_idx[i]], p.df.columns[col_idx[i]],
+            float(values[i]), reason[i], None if np.isnan(ref) else float(ref),
+        ))
+    return AnomalyReport(rows)
+
+
+class AnomalyScanner:
+    """매 rerun마다 부르는 용도: 대리점 목록과 데이터가 그대로면 직전 결과를 재사용"""
+
+    def __init__(self):
+        self._inputs = None  # [(정책 키, df), ...]
+        self._report = None
+
+    def scan(self, policies):
+        inputs = [(_policy_key(p), p.df) for p in policies]
+        cached = self._inputs
+        if (cached is not None and len(cached) == len(inputs)
+                and all(a[0] == b[0] and a[1] is b[1] for a, b in zip(cached, inputs))):
+            return self._report
+        self._inputs = inputs
+        self._report = detect_anomalies(policies)
+        return self._report
@@ -0,0 +1,177 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+# --- 성능 측정 모드 (느린 배틀의 원인 파악용, 기본은 꺼짐) ---
+# 사이드바 '성능 측정' 토글을 켜거나 SUNGZIDANG_PROFILE=1로 실행하면
+#   - 스크립트 실행 1회(위젯 조작 한 번), 조각(fragment)만 다시 실행된 경우는 그 조각 실행 1회
+#   - 그동안 제출한 작업 1건 (엑셀 생성/분석/OCR, job_id 기준)
+# 을 cProfile로 측정해 .cache/profiles에 저장한다.
+#   <이름>.prof : pstats 원본 (snakeviz 등으로 열기)
+#   <이름>.txt  : 누적/자체 시간 상위 함수 요약 (버그 리포트에 첨부)
+# 네트워크 대기(Gemini/Supabase)는 대기 함수(queue.get, socket 등)의 시간으로 나타난다.
+# Gemini 호출/페이지 병렬 처리는 다른 스레드에서 돌기 때문에 작업 프로파일에는 그 대기 시간만 잡힌다.
+# 파이썬 3.12부터는 프로파일러가 프로세스에 하나뿐이라, 다른 측정이 진행 중이면 측정 없이 그냥 실행한다.
+
+DEFAULT_PROFILE_DIR = os.path.join(".cache", "profiles")
+MAX_PROFILES = 40  # 보관할 프로파일 수 (오래된 것부터 삭제)
+TOP_FUNCTIONS = 30  # 요약에 넣을 함수 수
+
+_scripts = {}  # 스레드 id -> 진행 중인 스크립트 측정
+_scripts_lock = threading.Lock()
+
+
+def profiling_enabled():
+    """환경 변수로 항상 켜져 있는지"""
+    return os.environ.get("SUNGZIDANG_PROFILE", "").lower() in ("1", "true", "yes", "on")
+
+
+def _summary(profiler, label, elapsed):
+    out = io.StringIO()
+    out.write(f"# {label}\n")
+    out.write(f"# {time.strftime('%Y-%m-%d %H:%M:%S')} · 실제 소요 {elapsed:.3f}초\n\n")
+    stats = pstats.Stats(profiler, stream=out).strip_dirs()
+    out.write("## 누적 시간 순 (하위 호출 포함)\n")
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+    out.write("## 자체 시간 순 (하위 호출 제외)\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+def _prune(directory):
+    names = sorted(
+        (n for n in os.listdir(directory) if n.endswith(".prof")),
+        key=lambda n: os.path.getmtime(os.path.join(directory, n)),
+    )
+    for name in names[:-MAX_PROFILES]:
+        for ext in (".prof", ".txt"):
+            try:
+                os.remove(os.path.join(directory, name[:-5] + ext))
+            except OSError:
+                pass
+
+
+class Profile:
+    """cProfile 측정 1회. start() 후 finish()하면 .prof/.txt를 저장하고 요약 경로 반환"""
+
+    def __init__(self, name, label=None, directory=DEFAULT_PROFILE_DIR):
+        self.name = name
+        self.label = label or name
+        self.directory = directory
+        self._profiler = None
+        self._started = None
+
+    def start(self):
+        """측정 시작. 프로파일러를 쓸 수 없으면 False (측정 없이 진행)"""
+        try:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        except ValueError:
+            # 다른 측정이나 디버거가 프로파일러를 쓰는 중 (파이썬 3.12+)
+            self._profiler = None
+            return False
+        self._started = time.perf_counter()
+        return True
+
+    def discard(self):
+        """저장 없이 측정 중단"""
+        if self._profiler is None:
+            return
+        self._profiler.disable()
+        self._profiler = None
+
+    def finish(self):
+        if self._profiler is None:
+            return None
+        self._profiler.disable()
+        elapsed = time.perf_counter() - self._started
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, self.name)
+            self._profiler.dump_stats(base + ".prof")
+            with open(base + ".txt", "w", encoding="utf-8") as f:
+                f.write(_summary(self._profiler, self.label, elapsed))
+            _prune(self.directory)
+        finally:
+            self._profiler = None
+        return base + ".txt"
+
+
+def start_script_profile(label="script", directory=DEFAULT_PROFILE_DIR):
+    """
+    Streamlit 스크립트 실행 1회 측정 시작 (스크립트 끝에서 finish_script_profile 호출).
+    st.rerun()/st.stop()으로 중간에 끝난 실행은 같은 스레드의 다음 실행 시작 때
+    (스레드가 끝났으면 아무 스크립트나 다음 실행 시작 때) 저장 없이 버린다.
+    """
+    ident = threading.get_ident()
+    alive = {t.ident for t in threading.enumerate()}
+    with _scripts_lock:
+        for owner in [o for o in _scripts if o == ident or o not in alive]:
+            _scripts.pop(owner).discard()
+        profile = Profile(f"script-{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{ident % 10000:04d}", label, directory)
+        if profile.start():
+            _scripts[ident] = profile
+            return profile
+    return None
+
+
+def finish_script_profile():
+    """현재 스레드의 스크립트 측정을 저장하고 요약 경로 반환 (측정 중이 아니면 None)"""
+    with _scripts_lock:
+        profile = _scripts.pop(threading.get_ident(), None)
+    return profile.finish() if profile is not None else None
+
+
+@contextmanager
+def fragment_profile(label, enabled=True, directory=DEFAULT_PROFILE_DIR):
+    """
+    조각(fragment)만 다시 실행될 때 그 실행을 측정 (예: 필터 multiselect 조작).
+    전체 스크립트 실행 중에 불린 조각은 스크립트 측정에 이미 포함되므로 따로 측정하지 않는다.
+    """
+    ident = threading.get_ident()
+    with _scripts_lock:
+        in_script = ident in _scripts
+    profile = None
+    if enabled and not in_script:
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}"
+        profile = Profile(f"fragment-{label}-{stamp}-{ident % 10000:04d}", f"{label} 조각 실행", directory)
+        if not profile.start():
+            profile = None
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.finish()
+
+
+def recent_profiles(limit=5, directory=DEFAULT_PROFILE_DIR):
+    """최근 측정 결과 [(이름, 요약 경로, .prof 경로)] - 최신순"""
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(".txt"):
+            continue
+        base = os.path.join(directory, name[:-4])
+        try:
+            # 목록을 읽는 사이 _prune으로 지워진 측정은 건너뜀
+            mtime = os.path.getmtime(base + ".txt")
+            os.stat(base + ".prof")
+        except OSError:
+            continue
+        entries.append((mtime, name[:-4], base))
+    entries.sort(reverse=True)
+    return [(n, b + ".txt", b + ".prof") for _, n, b in entries[:limit]]
+
+
+def read_profile_file(path):
+    """다운로드용 파일 내용 (그 사이 지워졌으면 안내 문구)"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return "오래되어 삭제된 측정 결과입니다. 다시 측정해주세요.\n".encode("utf-8")
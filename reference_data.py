@@ -0,0 +1,33 @@
+import json
+
+# --- Reference Data Loading ---
+REFERENCE_DB_PATH = 'data/reference_db.json'
+
+
+def load_reference_data():
+    """Loads reference data (models, plans) from JSON file."""
+    try:
+        with open(REFERENCE_DB_PATH, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data
+    except FileNotFoundError:
+        return {"models": [], "plans": []}
+
+
+REFERENCE_DATA = load_reference_data()
+VALID_MODEL_NAMES = [m['name'] for m in REFERENCE_DATA.get('models', [])]
+VALID_PLAN_NAMES = REFERENCE_DATA.get('plans', [])
+
+
+def map_model_code_to_name(code):
+    """모델 코드(SM-XXXX)를 reference_db.json의 표준 모델명으로 변환"""
+    if not code or not isinstance(code, str):
+        return code
+
+    # 정확한 매칭 시도
+    for model_info in REFERENCE_DATA.get('models', []):
+        if code in model_info.get('codes', []):
+            return model_info['name']
+
+    # 매칭 실패시 원래 값 반환
+    return code
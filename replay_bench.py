@@ -0,0 +1,47 @@
+import argparse
+import os
+import time
+
+from extractors import ReplayExtractor, DEFAULT_RECORDINGS_DIR
+from gemini_parser import parse_image_with_gemini_v2
+
+# 녹화된 Gemini 응답으로 배틀 파싱 파이프라인을 오프라인 실행/측정
+# 녹화: SUNGZIDANG_EXTRACTOR=record streamlit run app.py 로 평소처럼 분석
+# 재생: python replay_bench.py 시세표1.jpg 시세표2.jpg --repeat 20
+
+
+def run_bench(image_paths, recordings_dir, latency, repeat):
+    extractor = ReplayExtractor(recordings_dir, latency)
+    images = []
+    for path in image_paths:
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read()))
+
+    timings = []
+    for _ in range(repeat):
+        for name, image_bytes in images:
+            started = time.perf_counter()
+            parse_image_with_gemini_v2(image_bytes, name, "#FFFFFF", None, "replay", extractor=extractor)
+            timings.append(time.perf_counter() - started)
+
+    for name, image_bytes in images:
+        df, _ = parse_image_with_gemini_v2(image_bytes, name, "#FFFFFF", None, "replay", extractor=extractor)
+        print(f"{name}: 모델 {len(df)}개, 조건 {len(df.columns)}개")
+
+    timings.sort()
+    total = sum(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"호출 {len(timings)}회, 평균 {total / len(timings) * 1000:.1f}ms, "
+          f"p95 {p95 * 1000:.1f}ms, 처리량 {len(timings) / total:.1f}건/초")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="녹화된 응답으로 parse_image_with_gemini_v2 재생 벤치마크")
+    parser.add_argument("images", nargs="+", help="녹화 당시 사용한 시세표 이미지 파일")
+    parser.add_argument("--recordings", default=os.environ.get("SUNGZIDANG_RECORDINGS", DEFAULT_RECORDINGS_DIR))
+    parser.add_argument("--latency", default="0", help='재생 지연(초) 또는 "recorded"')
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    latency = args.latency if args.latency == "recorded" else float(args.latency)
+    run_bench(args.images, args.recordings, latency, args.repeat)
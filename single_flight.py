@@ -0,0 +1,75 @@
+import hashlib
+import threading
+
+# --- 같은 요청 동시 실행 합치기 (프로세스 전체) ---
+# 아침 시간대에 여러 영업사원이 같은 대리점 시세표를 거의 동시에 올리면 세션마다 같은 Gemini 호출/업로드가 나간다.
+# 같은 키의 요청이 이미 진행 중이면 새로 보내지 않고 그 요청이 끝나기를 기다렸다가 같은 결과(또는 같은 예외)를 받는다.
+# 끝난 결과는 보관하지 않는다 (완료된 분석 재사용은 ParseStore, 업로드 재사용은 object_store가 담당).
+
+SHARED = "shared"  # 다른 요청의 결과를 함께 받은 경우 (hedging 경로 기록용)
+
+
+def bytes_key(*parts):
+    """bytes/문자열 조합으로 요청 키 생성 (이미지 내용은 해시로)"""
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+        h.update(hashlib.sha256(data).digest())
+    return h.hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    key별로 동시에 하나만 실행. do(key, fn)는 (결과, 다른 요청 결과를 받았는지) 반환.
+    calls: fn을 실제로 실행한 횟수, shared: 진행 중인 요청에 합쳐진 횟수
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+
+        try:
+            flight.value = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # 끝난 뒤에 들어온 요청은 새로 실행 (결과 보관 안 함)
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+
+# 프로세스 전체에서 공유 (모든 세션의 작업 워커 스레드가 함께 사용)
+gemini_flight = SingleFlight()
+upload_flight = SingleFlight()
@@ -0,0 +1,75 @@
+import pandas as pd
+
+from battle_engine import BattleBoard
+from policy_data import PolicyData
+from policy_diff import diff_frames
+from price_checks import detect_anomalies
+
+# 섹션이 나뉜 시세표처럼 같은 모델이 여러 행에 나오는 경우의 재업로드 비교 / 증분 승자 계산
+
+COL = "I|공시 MNP(5GX)"
+
+
+def _policy(df):
+    policy = PolicyData(name="A", image_bytes=None, color_hex="#FFFFFF", pages=[])
+    policy.apply_analysis(df, "")
+    return policy
+
+
+def test_diff_detects_change_in_repeated_model_row():
+    old = pd.DataFrame({COL: [10, 5]}, index=["S24", "S24"])
+    new = pd.DataFrame({COL: [10, 40]}, index=["S24", "S24"])
+
+    diff = diff_frames(old, new)
+
+    assert diff.entries == [("변경", "S24", COL, 5.0, 40.0)]
+    assert diff.models == {"S24"}
+
+
+def test_incremental_board_matches_full_recompute_with_repeated_models():
+    policy = _policy(pd.DataFrame({COL: [10, 5]}, index=["S24", "S24"]))
+    board = BattleBoard()
+    board.sync([policy])
+
+    policy.apply_analysis(pd.DataFrame({COL: [10, 40]}, index=["S24", "S24"]), "")
+    board.sync([policy])
+
+    fresh = BattleBoard()
+    fresh.sync([policy])
+    assert board.winners()["S24"]["공시(MNP)"][0] == 40
+    assert board.winners() == fresh.winners()
+
+
+def test_repeated_column_key_change_reaches_board():
+    cols = ["I|공시 MNP(5GX)", "I|공시 번이 MNP(5GX)"]
+    policy = _policy(pd.DataFrame([[10, 20]], index=["S24"], columns=cols))
+    board = BattleBoard()
+    board.sync([policy])
+
+    new = pd.DataFrame([[10, 90]], index=["S24"], columns=cols)
+    diff = diff_frames(policy.df, new)
+    assert diff.entries == [("변경", "S24", cols[1], 20.0, 90.0)]
+    assert diff.models == {"S24"}
+
+    policy.apply_analysis(new, "")
+    board.sync([policy])
+
+    fresh = BattleBoard()
+    fresh.sync([policy])
+    assert board.winners()["S24"]["공시(MNP)"][0] == 90
+    assert board.winners() == fresh.winners()
+
+
+def test_flagged_cell_excludes_only_its_own_repeated_row():
+    # 두 번째 섹션의 S24만 "1500"으로 잘못 읽힘 → 첫 섹션의 S24 값은 승자 후보로 남아야 함
+    policy = _policy(pd.DataFrame({COL: [30, 1500]}, index=["S24", "S24"]))
+    anomalies = detect_anomalies([policy])
+    assert anomalies.cells(policy.id) == {("S24", 1, COL)}
+
+    policy.excluded_cells = anomalies.cells(policy.id)
+    board = BattleBoard()
+    board.sync([policy])
+    assert board.winners()["S24"]["공시(MNP)"][0] == 30
+
+    styles = anomalies.highlight(policy.id, policy.df)._compute().ctx
+    assert (1, 0) in styles and (0, 0) not in styles